@@ -0,0 +1,74 @@
+"""Cold-start import benchmark for the graph, bot and MCP server entry points.
+
+Each entry point is imported in a fresh `python -X importtime` process. The run fails when
+an entry point exceeds its budget or pulls in a module that should only load on demand.
+
+    python benchmarks/import_time.py [--repeat N]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# cumulative import time budget (ms) per entry point
+BUDGETS_MS = {
+    "src.agent.wwdc_translator": 1500,
+    "src.agent.wwdc_pipeline": 1500,
+    "src.bot.wwdc_translator_bot": 1500,
+    "src.tools.scrapy_spider.mcp": 1000,
+}
+
+# heavy modules that must only be imported when a crawl or LLM call actually happens
+DEFERRED_MODULES = ("scrapy", "twisted", "langchain_openai", "openai", "langgraph.prebuilt")
+
+
+def measure(module: str) -> tuple[float, list[tuple[float, str]], list[str]]:
+    """Return (cumulative ms, top self times, deferred modules loaded) for one cold import."""
+    code = f"import sys, {module}; print(','.join(m for m in {DEFERRED_MODULES!r} if m in sys.modules))"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, capture_output=True, text=True, check=True)
+    total = 0.0
+    self_times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        try:
+            self_us, cumulative_us = int(fields[0]), int(fields[1])
+        except ValueError:
+            continue  # header line
+        name = fields[2].strip()
+        self_times.append((self_us / 1000, name))
+        if name == module:
+            total = cumulative_us / 1000
+    loaded = [name for name in result.stdout.strip().split(",") if name]
+    return total, sorted(self_times, reverse=True)[:5], loaded
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=3, help="cold imports per entry point, the median is reported")
+    args = parser.parse_args()
+
+    failed = False
+    for module, budget in BUDGETS_MS.items():
+        runs = [measure(module) for _ in range(args.repeat)]
+        total = statistics.median(run[0] for run in runs)
+        _, top, loaded = runs[-1]
+        status = "ok" if total <= budget and not loaded else "FAIL"
+        failed |= status == "FAIL"
+        print(f"{status:4} {module}: {total:.0f} ms (budget {budget} ms)")
+        if loaded:
+            print(f"     deferred modules imported eagerly: {', '.join(loaded)}")
+        for ms, name in top:
+            print(f"     {ms:8.1f} ms  {name}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
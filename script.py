@@ -1,6 +1,8 @@
 import os
+import argparse
 import subprocess
-import json
+
+from src.tools.scrapy_spider.markdown_builder import read_jsonl
 
 year = "2025"
 
@@ -20,19 +22,45 @@ def craw_videos():
         cwd=scrapy_path)
 
     try:
-        with open(output_path, "r") as f:
-            data = f.readlines()[-1].strip()
-            json_data = json.loads(data)
-            videos = json_data["videos"]
-            return videos
-    except:
+        return read_jsonl(output_path)[-1]["videos"]
+    except (OSError, ValueError, IndexError, KeyError):
         return None
 
 if __name__ == "__main__":
-    from src.bot.wwdc_translator_bot import translate_wwdc_videos
     from dotenv import load_dotenv
     load_dotenv()
     os.environ["LANGCHAIN_TRACING_V2"] = "false"
 
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", choices=["live", "batch", "plan", "watch"], default="live",
+                        help="live streams each video through the graph, batch submits all pending requests to the Batch API, "
+                             "plan only prints the pending work of the last crawled listing, "
+                             "watch keeps polling the listing and translates new sessions as they appear")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="in live mode, rewrite each chapter as soon as it is translated")
+    parser.add_argument("--poll-interval", type=float, default=60, help="seconds between batch status checks")
+    parser.add_argument("--tpm", type=int, default=None, help="in plan mode, the tokens per minute limit of the model")
+    parser.add_argument("--output-tps", type=float, default=50, help="in plan mode, output tokens per second of one call")
+    parser.add_argument("--podcast", action="store_true", help="in plan mode, include the podcast scripts")
+    parser.add_argument("--watch-interval", type=float, default=300, help="in watch mode, seconds between listing polls")
+    parser.add_argument("--status-port", type=int, default=8765, help="in watch mode, local port of the status endpoint")
+    args = parser.parse_args()
+
+    if args.mode == "plan":
+        from src.bot.wwdc_plan import print_plan
+        print_plan(year, os.environ.get("WWDC_LOCALES", "zh").split(","), concurrency=20,
+                   tpm=args.tpm, output_tps=args.output_tps, include_podcast=args.podcast)
+        raise SystemExit
+
+    if args.mode == "watch":
+        from src.bot.wwdc_watch import watch
+        watch(year, interval=args.watch_interval, max_concurrent=20, pipeline=args.pipeline, port=args.status_port)
+        raise SystemExit
+
     if videos := craw_videos():
-        translate_wwdc_videos(videos, max_concurrent=20)
+        if args.mode == "batch":
+            from src.bot.wwdc_batch_bot import translate_wwdc_videos_batch
+            translate_wwdc_videos_batch(videos, max_concurrent=20, poll_interval=args.poll_interval)
+        else:
+            from src.bot.wwdc_translator_bot import translate_wwdc_videos
+            translate_wwdc_videos(videos, max_concurrent=20, pipeline=args.pipeline)
@@ -0,0 +1,34 @@
+import asyncio
+import fcntl
+import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+
+@asynccontextmanager
+async def file_lock(path: str, poll_interval: float = 0.5) -> AsyncIterator[bool]:
+    """
+    Holds an exclusive `flock` on `path` (created if needed) for the duration of the block.
+
+    The lock is shared by every process on the host, and by every run within one process since
+    each call opens its own file description. It is released by the OS if the holder dies.
+    Waiting polls without blocking the event loop; the context value tells whether it had to wait.
+    """
+    if dirname := os.path.dirname(path):
+        os.makedirs(dirname, exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        waited = False
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                waited = True
+                await asyncio.sleep(poll_interval)
+        try:
+            yield waited
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
@@ -0,0 +1,65 @@
+from collections import Counter, defaultdict, deque
+from typing import Any, Deque, Dict
+
+
+def percentile(samples: list[float], q: float) -> float:
+    """Nearest-rank percentile of non-empty `samples`, `q` in [0, 1]."""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, round(q * len(ordered)) - 1))]
+
+
+class RouteMetrics:
+    """
+    Latency samples and event counters per model route, kept in memory for the life of the process.
+
+    Only the most recent `max_samples` latencies of each route are kept, so percentiles follow
+    the current behavior of a provider.
+    """
+
+    def __init__(self, max_samples: int = 500):
+        self.max_samples = max_samples
+        self.latencies: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=self.max_samples))
+        self.counters: Dict[str, Counter] = defaultdict(Counter)
+
+    def record(self, route: str, seconds: float, ok: bool = True):
+        self.counters[route]['calls'] += 1
+        if ok:
+            self.latencies[route].append(seconds)
+        else:
+            self.counters[route]['errors'] += 1
+
+    def count(self, route: str, event: str, n: int = 1):
+        self.counters[route][event] += n
+
+    def percentile(self, route: str, q: float) -> float | None:
+        if samples := self.latencies.get(route):
+            return percentile(list(samples), q)
+        return None
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """`{route: {calls, errors, ..., p50, p95}}`, latencies in seconds."""
+        result = {}
+        for route in sorted(self.counters.keys() | self.latencies.keys()):
+            samples = list(self.latencies.get(route, ()))
+            result[route] = {
+                **self.counters[route],
+                'p50': percentile(samples, 0.5) if samples else None,
+                'p95': percentile(samples, 0.95) if samples else None,
+            }
+        return result
+
+    def format(self) -> str:
+        lines = []
+        for route, stats in self.summary().items():
+            latency = f"p50 {stats['p50']:.1f}s, p95 {stats['p95']:.1f}s" if stats['p50'] is not None else "no successful calls"
+            events = ', '.join(f'{name} {count}' for name, count in stats.items() if name not in ('p50', 'p95'))
+            lines.append(f"{route}: {events}; {latency}")
+        return '\n'.join(lines)
+
+    def reset(self):
+        self.latencies.clear()
+        self.counters.clear()
+
+
+# shared by every graph run in the process
+metrics = RouteMetrics()
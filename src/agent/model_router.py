@@ -0,0 +1,138 @@
+import re
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Literal
+
+from pydantic import BaseModel, Field
+
+from src.tools.scrapy_spider.markdown_builder.document import FENCE_RE, PLACEHOLDER_RE
+
+# share of non-blank lines that are code for content to count as code-heavy
+CODE_LINE_RATIO = 0.2
+
+_INLINE_CODE_RE = re.compile(r'`[^`\n]+`')
+_CJK_RE = re.compile(r'[　-ヿ㐀-䶿一-鿿가-힯＀-￯]')
+
+# API status codes meaning the endpoint is overloaded or rate limited, so the next endpoint is tried
+SATURATED_STATUS_CODES = (429, 503, 529)
+
+
+class ModelRoute(BaseModel):
+    """
+    A routing rule. Calls of `stage` whose content falls within the token and content limits are sent to `model`.
+    """
+    name: str | None = Field(None, description="Label used in the latency metrics, defaults to the model.")
+    stage: Literal["translate", "rewrite", "podcast", "summarize"] | None = Field(None, description="Only match calls of this stage.")
+    content: Literal["code", "prose"] | None = Field(None, description="Only match code-heavy or prose content.")
+    min_tokens: int = Field(0, description="Only match content of at least this many (estimated) tokens.")
+    max_tokens: int | None = Field(None, description="Only match content of at most this many (estimated) tokens.")
+    model: str = Field(..., description="The model to use.")
+    base_url: str | None = Field(None, description="The base URL of the OpenAI API, defaults to the configured one.")
+    api_key: str | None = Field(None, description="The API key to use, defaults to the configured one.")
+    max_in_flight: int | None = Field(None, description="Calls in flight above which the route counts as saturated.")
+
+    def matches(self, stage: str | None, tokens: int, kind: str) -> bool:
+        return (self.stage is None or self.stage == stage) \
+            and (self.content is None or self.content == kind) \
+            and tokens >= self.min_tokens \
+            and (self.max_tokens is None or tokens <= self.max_tokens)
+
+
+@dataclass(frozen=True)
+class Endpoint:
+    name: str
+    model: str
+    base_url: str
+    api_key: str
+    max_in_flight: int | None = None
+
+    def apply(self, config: Dict[str, Any]) -> Dict[str, Any]:
+        """A copy of the run config that sends calls to this endpoint."""
+        return {**config, 'configurable': {
+            **config['configurable'], 'model': self.model, 'base_url': self.base_url, 'api_key': self.api_key}}
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count without a tokenizer: about one token per CJK character and per four other characters.
+    """
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def content_kind(text: str) -> str:
+    """
+    "code" when fenced code, code placeholders or inline code make up `CODE_LINE_RATIO` of the lines, else "prose".
+    """
+    code = total = 0
+    in_fence = False
+    for line in text.split('\n'):
+        if not line.strip():
+            continue
+        total += 1
+        if FENCE_RE.match(line):
+            in_fence = not in_fence
+            code += 1
+        elif in_fence or PLACEHOLDER_RE.search(line) or _INLINE_CODE_RE.search(line):
+            code += 1
+    return 'code' if total and code / total >= CODE_LINE_RATIO else 'prose'
+
+
+def _route(value: ModelRoute | Dict[str, Any]) -> ModelRoute:
+    return value if isinstance(value, ModelRoute) else ModelRoute.model_validate(value)
+
+
+def select_endpoints(config: Dict[str, Any], stage: str | None, content: str) -> List[Endpoint]:
+    """
+    The endpoint picked by the first matching routing rule (or the configured model), then the fallback endpoint.
+    """
+    configurable = config['configurable']
+    base_url = configurable.get("base_url", "")
+    api_key = configurable.get("api_key", "")
+    endpoints = []
+
+    routes = [_route(route) for route in configurable.get("routes") or []]
+    if routes:
+        tokens, kind = estimate_tokens(content), content_kind(content)
+        for route in routes:
+            if route.matches(stage, tokens, kind):
+                endpoints.append(Endpoint(route.name or route.model, route.model, route.base_url or base_url,
+                                          route.api_key or api_key, route.max_in_flight))
+                break
+    if not endpoints:
+        model = configurable.get("model", "")
+        endpoints.append(Endpoint(model, model, base_url, api_key, configurable.get("max_in_flight")))
+
+    if fallback_model := configurable.get("fallback_model"):
+        endpoints.append(Endpoint(f'{fallback_model} (fallback)', fallback_model,
+                                  configurable.get("fallback_base_url") or base_url,
+                                  configurable.get("fallback_api_key") or api_key))
+    return endpoints
+
+
+_in_flight: Counter = Counter()
+
+
+def is_saturated(endpoint: Endpoint) -> bool:
+    return endpoint.max_in_flight is not None and _in_flight[endpoint] >= endpoint.max_in_flight
+
+
+def by_availability(endpoints: List[Endpoint]) -> List[Endpoint]:
+    """Endpoints with free capacity first, keeping the routing order otherwise."""
+    return sorted(endpoints, key=is_saturated)
+
+
+@contextmanager
+def in_flight(endpoint: Endpoint) -> Iterator[None]:
+    _in_flight[endpoint] += 1
+    try:
+        yield
+    finally:
+        _in_flight[endpoint] -= 1
+
+
+def is_saturated_error(error: BaseException) -> bool:
+    """Whether an API error means the endpoint is overloaded or rate limited rather than the request being bad."""
+    status = getattr(error, 'status_code', None) or getattr(getattr(error, 'response', None), 'status_code', None)
+    return status in SATURATED_STATUS_CODES or type(error).__name__ == 'RateLimitError'
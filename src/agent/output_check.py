@@ -0,0 +1,74 @@
+import re
+from dataclasses import dataclass, field
+from typing import List
+
+from src.tools.scrapy_spider.markdown_builder.document import FENCE_RE, PLACEHOLDER_RE
+
+_HEADING_RE = re.compile(r'^#{1,6}\s', re.M)
+
+
+class Completion(str):
+    """A model answer that remembers why generation stopped (`"stop"`, `"length"`, ...)."""
+    finish_reason: str | None
+
+    def __new__(cls, content: str, finish_reason: str | None = None):
+        completion = super().__new__(cls, content)
+        completion.finish_reason = finish_reason
+        return completion
+
+
+@dataclass
+class OutputCheck:
+    """
+    Structural problems of a model answer compared with its source markdown.
+
+    `truncated` means the answer stops early (at the max tokens limit, or with the last headings
+    or placeholders of the source missing) and the rest can be asked for with a continuation.
+    Other problems can only be fixed by requesting the same input again.
+    """
+    problems: List[str] = field(default_factory=list)
+    truncated: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return not self.problems
+
+
+def count_headings(markdown: str) -> int:
+    return len(_HEADING_RE.findall(markdown))
+
+
+def check_output(source: str, output: str, finish_reason: str | None = None, headings: bool = True) -> OutputCheck:
+    """
+    Compares the answer `output` with the `prompt_text` it was produced from.
+
+    Placeholders must all come back, fences must be balanced, and with `headings` the answer
+    must keep at least as many headings as the source (rewrites may add sub-headings).
+    """
+    check = OutputCheck()
+    if finish_reason == "length":
+        check.problems.append("stopped at the max tokens limit")
+        check.truncated = True
+
+    if len(FENCE_RE.findall(output)) % 2:
+        check.problems.append("a code fence is not closed")
+        check.truncated = True
+
+    expected = [int(index) for index in PLACEHOLDER_RE.findall(source)]
+    found = {int(index) for index in PLACEHOLDER_RE.findall(output)}
+    if missing := [index for index in expected if index not in found]:
+        check.problems.append(f"{len(missing)} of {len(expected)} placeholders are missing")
+        # only the last placeholders missing means the answer stops before them
+        check.truncated |= missing == expected[len(expected) - len(missing):]
+
+    if headings and (count := count_headings(output)) < (expected_count := count_headings(source)):
+        check.problems.append(f"{count} of {expected_count} headings")
+        check.truncated = True
+    return check
+
+
+def continuation_point(output: str) -> str:
+    """The answer up to its last complete paragraph, where a continuation picks up."""
+    output = output.rstrip()
+    end = output.rfind('\n\n')
+    return output[:end].rstrip() if end > 0 else output
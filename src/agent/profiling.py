@@ -0,0 +1,219 @@
+import asyncio
+import cProfile
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, TypeVar
+
+from src.agent.metrics import percentile
+from src.paths import OUTPUT_BASE_DIR
+
+T = TypeVar("T")
+
+PROFILE_DIR = os.environ.get("WWDC_PROFILE_DIR") or os.path.join(OUTPUT_BASE_DIR, 'profiles')
+SAMPLE_INTERVAL = 0.01
+LOOP_INTERVAL = 0.1
+
+
+def profile_mode(config: Dict[str, Any] | None = None) -> str | None:
+    """
+    "sample", "cprofile" or None when profiling is off.
+
+    Switched on by `WWDC_PROFILE=sample|cprofile` (any other non-empty value means "sample"),
+    or by the `profile` field of the run configuration.
+    """
+    mode = os.environ.get("WWDC_PROFILE", "").strip().lower()
+    if mode in ("", "0", "false", "off"):
+        return "sample" if config and config.get('configurable', {}).get("profile") else None
+    return mode if mode in ("sample", "cprofile") else "sample"
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _async_stack(coro) -> List[str]:
+    """
+    Logical stack of a suspended coroutine, following what each frame awaits down to the pending future.
+    """
+    frames = []
+    while coro is not None:
+        if isinstance(coro, asyncio.Task):
+            coro = coro.get_coro()
+        frame = getattr(coro, 'cr_frame', None) or getattr(coro, 'gi_frame', None)
+        if frame is None:
+            break
+        frames.append(_frame_name(frame))
+        coro = getattr(coro, 'cr_await', None) or getattr(coro, 'gi_yieldfrom', None)
+    if coro is not None:
+        frames.append("<waiting>")
+    return frames
+
+
+def _thread_stack(frame) -> List[str]:
+    frames = []
+    while frame is not None:
+        frames.append(_frame_name(frame))
+        frame = frame.f_back
+    return frames[::-1]
+
+
+class Profile:
+    """
+    Sampled stacks of one video, written in the collapsed format read by flamegraph.pl and speedscope.
+
+    Samples of async nodes are wall clock: they show where the node was waiting, not only
+    where it was running.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.stacks: Counter = Counter()
+        self.lock = threading.Lock()
+
+    def add(self, frames: List[str]):
+        with self.lock:
+            self.stacks[';'.join(frame.replace(';', ':') for frame in frames)] += 1
+
+    def write(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self.lock:
+            lines = [f"{stack} {count}" for stack, count in self.stacks.most_common()]
+        with open(self.path, 'w', encoding='utf-8') as file:
+            file.write('\n'.join(lines) + '\n')
+
+
+# profiles of the most recently profiled videos, a long running watch daemon would otherwise keep every one
+_profiles: "OrderedDict[tuple[str, str], Profile]" = OrderedDict()
+PROFILE_MEMORY_SIZE = 32
+
+
+def video_profile(config: Dict[str, Any]) -> Profile:
+    key = (config['configurable']["year"], config['configurable']["video_id"])
+    if key not in _profiles:
+        _profiles[key] = Profile(os.path.join(PROFILE_DIR, key[0], f'{key[1]}.folded'))
+    _profiles.move_to_end(key)
+    # far more than the videos in flight at once, so a video is not evicted between its nodes
+    while len(_profiles) > PROFILE_MEMORY_SIZE:
+        _profiles.popitem(last=False)
+    return _profiles[key]
+
+
+async def sample_task(awaitable: Awaitable[T], profile: Profile, interval: float = SAMPLE_INTERVAL) -> T:
+    """Run `awaitable` as a task, sampling its async stack every `interval` seconds until it is done."""
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while not task.done():
+            await asyncio.wait({task}, timeout=interval)
+            if not task.done():
+                profile.add(_async_stack(task))
+        return task.result()
+    finally:
+        if not task.done():
+            task.cancel()
+
+
+def profiled(node: Callable[[Any, Dict[str, Any]], Awaitable[T]]) -> Callable[[Any, Dict[str, Any]], Awaitable[T]]:
+    """Graph node decorator sampling the node into its video's profile when profiling is on."""
+    @functools.wraps(node)
+    async def wrapper(state, config):
+        if not profile_mode(config):
+            return await node(state, config)
+        profile = video_profile(config)
+        try:
+            return await sample_task(node(state, config), profile)
+        finally:
+            await asyncio.to_thread(profile.write)
+    return wrapper
+
+
+def profile_call(config: Dict[str, Any], name: str, function: Callable[[], T]) -> T:
+    """
+    Run a blocking call in the current (worker) thread, profiled when profiling is on.
+
+    "sample" samples the thread into the video's profile, "cprofile" writes a
+    `<video_id>.<name>.prof` file next to it.
+    """
+    if not (mode := profile_mode(config)):
+        return function()
+    profile = video_profile(config)
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(function)
+        finally:
+            os.makedirs(os.path.dirname(profile.path), exist_ok=True)
+            profiler.dump_stats(profile.path[:-len('.folded')] + f'.{name}.prof')
+
+    thread_id = threading.get_ident()
+    done = threading.Event()
+
+    def sample():
+        while not done.wait(SAMPLE_INTERVAL):
+            if frame := sys._current_frames().get(thread_id):
+                profile.add([name, *_thread_stack(frame)])
+
+    sampler = threading.Thread(target=sample, name=f'profile-{name}', daemon=True)
+    sampler.start()
+    try:
+        return function()
+    finally:
+        done.set()
+        sampler.join()
+        profile.write()
+
+
+class LoopMonitor:
+    """
+    Event loop lag and task count, sampled every `interval` seconds from inside the loop.
+
+    Lag is how much later than asked a `sleep(interval)` wakes up, i.e. how long callbacks
+    held the loop.
+    """
+
+    def __init__(self, interval: float = LOOP_INTERVAL):
+        self.interval = interval
+        self.lags: List[float] = []
+        self.task_counts: List[int] = []
+        self.started = 0.0
+        self._task: asyncio.Task | None = None
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, time.perf_counter() - start - self.interval))
+            self.task_counts.append(len(asyncio.all_tasks()))
+
+    async def __aenter__(self) -> 'LoopMonitor':
+        self.started = time.perf_counter()
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'seconds': round(time.perf_counter() - self.started, 3),
+            'samples': len(self.lags),
+            'lag_p50_ms': round(percentile(self.lags, 0.5) * 1000, 1) if self.lags else None,
+            'lag_p95_ms': round(percentile(self.lags, 0.95) * 1000, 1) if self.lags else None,
+            'lag_max_ms': round(max(self.lags) * 1000, 1) if self.lags else None,
+            'tasks_mean': round(sum(self.task_counts) / len(self.task_counts), 1) if self.task_counts else None,
+            'tasks_max': max(self.task_counts) if self.task_counts else None,
+        }
+
+    def write(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(self.summary(), file, indent=2)
@@ -0,0 +1,220 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import time
+import unicodedata
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+from src.tools.scrapy_spider.markdown_builder.document import FENCE_RE, PLACEHOLDER_RE
+
+_HEADING_RE = re.compile(r'^(#{1,6}\s+)(.*)$')
+_QUOTE_RE = re.compile(r'^(>\s?)(.*)$')
+# Split after sentence punctuation, keeping the punctuation with the sentence.
+_SENTENCE_RE = re.compile(r'(?<=[.!?。！？])[)"\'”’]*\s+(?=\S)')
+_MARKER_RE = re.compile(r'^\s*<<(\d+)>>\s*$')
+
+_QUOTE_TRANSLATION = str.maketrans({
+    '‘': "'", '’': "'", '“': '"', '”': '"', '\u00a0': ' ',
+})
+
+
+def normalize_segment(text: str) -> str:
+    """
+    Normalizes a segment so that trivially different sources share one memory entry.
+    """
+    text = unicodedata.normalize('NFKC', text).translate(_QUOTE_TRANSLATION)
+    return ' '.join(text.split())
+
+
+def segment_key(text: str) -> str:
+    return hashlib.sha1(normalize_segment(text).encode('utf-8')).hexdigest()
+
+
+def split_sentences(paragraph: str) -> list[str]:
+    return [sentence.strip() for sentence in _SENTENCE_RE.split(paragraph) if sentence.strip()]
+
+
+def join_sentences(sentences: list[str]) -> str:
+    """
+    Joins translated sentences, only inserting spaces between latin text.
+    """
+    result = ''
+    for sentence in sentences:
+        if result and result[-1].isascii() and not result[-1].isspace() and sentence[:1].isascii():
+            result += ' '
+        result += sentence
+    return result
+
+
+@dataclass
+class _Block:
+    prefix: str = ''
+    sentences: list[str] | None = None  # None means the block is kept verbatim
+    text: str = ''
+
+
+@dataclass
+class SegmentedMarkdown:
+    """
+    Markdown split into translatable sentence segments.
+
+    Code fences and passthrough placeholders are kept verbatim, headings and quotes
+    keep their markdown prefix, and every other block is split into sentences.
+    """
+    blocks: list[_Block] = field(default_factory=list)
+
+    @classmethod
+    def parse(cls, markdown: str) -> 'SegmentedMarkdown':
+        blocks: list[_Block] = []
+        lines = markdown.split('\n')
+        i = 0
+        while i < len(lines):
+            line = lines[i]
+            if FENCE_RE.match(line):
+                end = i + 1
+                while end < len(lines) and not FENCE_RE.match(lines[end]):
+                    end += 1
+                blocks.append(_Block(text='\n'.join(lines[i:end + 1])))
+                i = end + 1
+                continue
+            if not line.strip() or PLACEHOLDER_RE.fullmatch(line.strip()):
+                blocks.append(_Block(text=line))
+            elif match := _HEADING_RE.match(line):
+                blocks.append(_Block(prefix=match.group(1), sentences=[match.group(2).strip()]))
+            elif match := _QUOTE_RE.match(line):
+                blocks.append(_Block(prefix=match.group(1), sentences=split_sentences(match.group(2))))
+            else:
+                blocks.append(_Block(sentences=split_sentences(line)))
+            i += 1
+        return cls(blocks)
+
+    def segments(self) -> list[str]:
+        return [sentence for block in self.blocks if block.sentences for sentence in block.sentences]
+
+    def render(self, translations: dict[str, str]) -> str:
+        """
+        Renders the markdown with every segment replaced by its translation (looked up by `segment_key`).
+        """
+        lines = []
+        for block in self.blocks:
+            if block.sentences is None:
+                lines.append(block.text)
+            else:
+                translated = [translations.get(segment_key(sentence), sentence) for sentence in block.sentences]
+                lines.append(block.prefix + join_sentences(translated))
+        return '\n'.join(lines)
+
+
+def format_segments_request(segments: list[str]) -> str:
+    return '\n'.join(f'<<{index}>>\n{segment}' for index, segment in enumerate(segments, start=1))
+
+
+def parse_segments_response(content: str, count: int) -> dict[int, str]:
+    """
+    Parses a `<<n>>` delimited response into `{index: translation}`, starting at 0.
+    """
+    result: dict[int, list[str]] = {}
+    current: list[str] | None = None
+    for line in content.split('\n'):
+        if match := _MARKER_RE.match(line):
+            index = int(match.group(1)) - 1
+            current = result.setdefault(index, []) if 0 <= index < count else None
+        elif current is not None:
+            current.append(line)
+    return {
+        index: text
+        for index, lines in result.items()
+        if (text := ' '.join(line.strip() for line in lines if line.strip()))
+    }
+
+
+class TranslationMemory:
+    """
+    Source/target segment pairs and glossary terms shared across sessions and runs.
+
+    Backed by a single SQLite file, so parallel videos and later runs reuse every
+    segment the translator has produced before.
+    """
+
+    def __init__(self, path: str, locale: str = 'zh'):
+        self.path = path
+        self.locale = locale
+        if dirname := os.path.dirname(path):
+            os.makedirs(dirname, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS segments ('
+                'key TEXT NOT NULL, locale TEXT NOT NULL, source TEXT NOT NULL, '
+                'target TEXT NOT NULL, hits INTEGER NOT NULL DEFAULT 0, updated_at REAL NOT NULL, '
+                'PRIMARY KEY (key, locale))')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS glossary ('
+                'term TEXT NOT NULL, locale TEXT NOT NULL, translation TEXT NOT NULL, '
+                'PRIMARY KEY (term, locale))')
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def lookup(self, segments: list[str]) -> dict[str, str]:
+        """
+        Returns `{segment_key: target}` for every segment already in memory.
+        """
+        keys = list({segment_key(segment) for segment in segments})
+        found: dict[str, str] = {}
+        with self._connect() as conn:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                rows = conn.execute(
+                    f'SELECT key, target FROM segments WHERE locale = ? AND key IN ({placeholders})',
+                    [self.locale, *chunk]).fetchall()
+                found.update(rows)
+            if found:
+                conn.executemany(
+                    'UPDATE segments SET hits = hits + 1 WHERE key = ? AND locale = ?',
+                    [(key, self.locale) for key in found])
+        return found
+
+    def store(self, pairs: list[tuple[str, str]]):
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                'INSERT INTO segments (key, locale, source, target, updated_at) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT (key, locale) DO UPDATE SET target = excluded.target, updated_at = excluded.updated_at',
+                [(segment_key(source), self.locale, source, target, now) for source, target in pairs if target.strip()])
+
+    def glossary(self) -> dict[str, str]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT term, translation FROM glossary WHERE locale = ? ORDER BY term', (self.locale,)).fetchall()
+        return dict(rows)
+
+    def update_glossary(self, terms: dict[str, str]):
+        with self._connect() as conn:
+            conn.executemany(
+                'INSERT INTO glossary (term, locale, translation) VALUES (?, ?, ?) '
+                'ON CONFLICT (term, locale) DO UPDATE SET translation = excluded.translation',
+                [(term, self.locale, translation) for term, translation in terms.items()])
+
+    def load_glossary_file(self, path: str):
+        """
+        Merges a `{term: translation}` JSON file into the stored glossary.
+        """
+        with open(path, 'r', encoding='utf-8') as file:
+            self.update_glossary(json.load(file))
+
+
+def format_glossary(glossary: dict[str, str]) -> str:
+    if not glossary:
+        return '无'
+    return '\n'.join(f'- {term}: {translation}' for term, translation in glossary.items())
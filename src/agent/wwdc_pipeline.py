@@ -0,0 +1,176 @@
+import asyncio
+import time
+from typing import Any, Callable, Dict
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.config import get_stream_writer
+from langgraph.graph import StateGraph
+
+from src.agent.profiling import profiled
+from src.agent.wwdc_translator import (
+    CacheType,
+    artifact_ref,
+    Configuration,
+    State,
+    crawl_wwdc_markdown,
+    get_cache,
+    for_each_locale,
+    load_document,
+    get_locales,
+    prepare_podcast_script,
+    prepare_rewrite,
+    prepare_translation,
+    resolve_request,
+    save_cache,
+    stage_lock,
+    within_budget,
+)
+from src.tools.scrapy_spider.markdown_builder import MarkdownDocument
+
+
+def join_chunks(chunks: list[str]) -> str:
+    return '\n\n'.join(chunk.strip() for chunk in chunks if chunk.strip())
+
+
+async def run_pipeline(state: State, config: RunnableConfig, emit: Callable[[Dict[str, Any]], None] = lambda _: None) -> Dict[str, Any]:
+    """
+    Translate and rewrite a crawled document chapter by chapter without stage barriers.
+
+    Every chapter chunk is rewritten as soon as its own translation is ready, and the podcast
+    script starts as soon as the last chapter is translated. Results are joined in chapter order
+    and saved into the same caches as the stage-by-stage graph. All target locales run from the
+    same chapter chunks and share the `max_concurrent_chunks` limit.
+    """
+    year = config['configurable']["year"]
+    video_id = config['configurable']["video_id"]
+    use_cache = config['configurable']["use_cache"]
+    locales = get_locales(config)
+    document = await load_document(state, config)
+    chunks = document.split_chapters()
+    semaphore = asyncio.Semaphore(config['configurable'].get("max_concurrent_chunks", 4))
+
+    async def run_locale(locale: str) -> Dict[str, Any]:
+        types = [CacheType.TRANSLATED_MARKDOWN, CacheType.REWRITED_MARKDOWN]
+        # the podcast script is only written for the first locale
+        if locale == locales[0] and config['configurable'].get("write_podcast_script", False):
+            types.append(CacheType.PODCAST_SCRIPT)
+
+        # the stages of one video are produced by a single run at a time, see `run_stage`
+        started = time.time()
+        async with stage_lock(year, video_id, *types, locale=locale) as waited:
+            cached = {}
+            if use_cache or waited:
+                for type in types:
+                    cached[type] = await get_cache(year, video_id, type, newer_than=None if use_cache else started, locale=locale)
+            result = await within_budget(
+                config,
+                _run_chapters(document, config, emit, cached, chunks, semaphore, locale, CacheType.PODCAST_SCRIPT in types),
+                f"chapters ({locale}) of {year} {video_id}")
+        return {
+            "translated_markdown": artifact_ref(CacheType.TRANSLATED_MARKDOWN, result["translated_markdown"], locale),
+            "rewrited_markdown": artifact_ref(CacheType.REWRITED_MARKDOWN, result["rewrited_markdown"], locale),
+            "podcast_script": artifact_ref(CacheType.PODCAST_SCRIPT, script) if (script := result["podcast_script"]) else None,
+        }
+
+    results = await for_each_locale(config, run_locale)
+    return {
+        "translated_markdown": results[locales[0]]["translated_markdown"],
+        "rewrited_markdown": results[locales[0]]["rewrited_markdown"],
+        "translations": {locale: result["translated_markdown"] for locale, result in results.items()},
+        "rewrites": {locale: result["rewrited_markdown"] for locale, result in results.items()},
+        "podcast_script": results[locales[0]]["podcast_script"],
+    }
+
+
+async def _run_chapters(document: MarkdownDocument, config: RunnableConfig, emit: Callable[[Dict[str, Any]], None],
+                        cached: Dict[CacheType, str | None], chunks: list[MarkdownDocument],
+                        semaphore: asyncio.Semaphore, locale: str, write_podcast: bool) -> Dict[str, Any]:
+    year = config['configurable']["year"]
+    video_id = config['configurable']["video_id"]
+
+    translated: list[str | None] = [None] * len(chunks)
+    rewritten: list[str | None] = [None] * len(chunks)
+
+    # a cached translation is reused chunk by chunk when it splits into the same chapters
+    if translation := cached.get(CacheType.TRANSLATED_MARKDOWN):
+        translated_chunks = [chunk.to_markdown() for chunk in MarkdownDocument.from_markdown(translation).split_chapters()]
+        if len(translated_chunks) == len(chunks):
+            translated = translated_chunks
+        else:
+            chunks = [document]
+            translated = [translation]
+            rewritten = [None]
+    all_translated = asyncio.Event()
+    # a chunk may well translate to an empty string, only `None` is still pending
+    if all(chunk is not None for chunk in translated):
+        all_translated.set()
+
+    async def process(index: int, chunk: MarkdownDocument):
+        if translated[index] is None:
+            async with semaphore:
+                request = await prepare_translation(chunk.to_markdown(), chunk, config, locale)
+                translated[index] = await resolve_request(config, request)
+            emit({"stage": "translate", "locale": locale, "chunk": index, "total": len(chunks)})
+            if all(chunk is not None for chunk in translated):
+                all_translated.set()
+        if not cached.get(CacheType.REWRITED_MARKDOWN):
+            part = (index, len(chunks)) if len(chunks) > 1 else None
+            async with semaphore:
+                request = await prepare_rewrite(translated[index], chunk, config, part=part, locale=locale)
+                rewritten[index] = await resolve_request(config, request)
+            emit({"stage": "rewrite", "locale": locale, "chunk": index, "total": len(chunks)})
+
+    async def podcast() -> str | None:
+        if not write_podcast:
+            return None
+        if script := cached.get(CacheType.PODCAST_SCRIPT):
+            return script
+        await all_translated.wait()
+        request = await prepare_podcast_script(join_chunks(translated), document, config)
+        script = await resolve_request(config, request)
+        emit({"stage": "podcast", "locale": locale, "chunk": None, "total": len(chunks)})
+        await save_cache(year, video_id, CacheType.PODCAST_SCRIPT, script)
+        return script
+
+    tasks = [asyncio.ensure_future(process(index, chunk)) for index, chunk in enumerate(chunks)]
+    tasks.append(asyncio.ensure_future(podcast()))
+    try:
+        *_, podcast_script = await asyncio.gather(*tasks)
+    except BaseException:
+        # a failed chunk fails the video, the podcast would otherwise wait for it forever
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+    translated_markdown = cached.get(CacheType.TRANSLATED_MARKDOWN) or join_chunks(translated)
+    if not cached.get(CacheType.TRANSLATED_MARKDOWN):
+        await save_cache(year, video_id, CacheType.TRANSLATED_MARKDOWN, translated_markdown, locale)
+    rewrited_markdown = cached.get(CacheType.REWRITED_MARKDOWN) or join_chunks(rewritten)
+    if not cached.get(CacheType.REWRITED_MARKDOWN):
+        await save_cache(year, video_id, CacheType.REWRITED_MARKDOWN, rewrited_markdown, locale)
+    return {
+        "translated_markdown": translated_markdown,
+        "rewrited_markdown": rewrited_markdown,
+        "podcast_script": podcast_script,
+    }
+
+# Nodes:
+
+@profiled
+async def stream_chapters(state: State, config: RunnableConfig) -> Dict[str, Any]:
+    """Translate, rewrite and optionally script the podcast chapter by chapter, streaming progress."""
+    if not state.markdown:
+        raise ValueError("No markdown content available for translation.")
+    return await run_pipeline(state, config, emit=get_stream_writer())
+
+
+graph = (
+    StateGraph(State, config_schema=Configuration)
+    .add_node(crawl_wwdc_markdown)
+    .add_node(stream_chapters)
+    .add_edge("__start__", "crawl_wwdc_markdown")
+    .add_edge("crawl_wwdc_markdown", "stream_chapters")
+    .add_edge("stream_chapters", "__end__")
+    .compile(name="WWDC Translator Pipeline Graph")
+)
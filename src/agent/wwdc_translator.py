@@ -1,26 +1,96 @@
 import asyncio
 import aiofiles
+import functools
+import hashlib
+import json
 import os
+import sqlite3
+import sys
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import AsyncExitStack, asynccontextmanager
+from dataclasses import dataclass
 from enum import Enum
-from typing import Any, Dict, TypedDict
+from typing import TYPE_CHECKING, Any, AsyncIterator, Awaitable, Callable, Dict, TypedDict, TypeVar, Union
 
 from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph
-from langgraph.prebuilt import create_react_agent
-from langchain_openai import ChatOpenAI
 from pydantic import BaseModel, Field
 
 from src.prompts import get_prompt, AgentType
 from src.tools.scrapy_spider.wwdc_task import WWDCTask
+from src.tools.scrapy_spider.markdown_builder import MarkdownDocument
+from src.paths import DEFAULT_LOCALE, OUTPUT_BASE_DIR
+from src.tools.search_index import SearchIndex, artifact_kind
+from src.agent.file_lock import file_lock
+from src.agent.metrics import metrics
+from src.agent.output_check import Completion, check_output, continuation_point
+from src.agent.profiling import profile_call, profiled
+from src.agent.model_router import Endpoint, ModelRoute, by_availability, in_flight, is_saturated_error, select_endpoints
+from src.agent.translation_memory import (
+    SegmentedMarkdown,
+    TranslationMemory,
+    format_glossary,
+    format_segments_request,
+    parse_segments_response,
+    segment_key,
+)
+
+T = TypeVar("T")
+
+if TYPE_CHECKING:
+    # the OpenAI client and prebuilt agents are imported on first LLM call, cache hits never need them
+    from langchain_openai import ChatOpenAI
+
+# model call deadline and hedging defaults, see `call_model`
+DEFAULT_CALL_TIMEOUT = 600
+DEFAULT_HEDGE_DELAY = 120
+HEDGE_MIN_SAMPLES = 10
+# follow-up calls spent on a truncated or malformed answer, and how much of it a continuation is shown
+DEFAULT_OUTPUT_REPAIRS = 2
+CONTINUATION_CONTEXT = 1500
+
+class CacheType(Enum):
+    ORIGINAL_MARKDOWN = "original_markdown"
+    ORIGINAL_DOCUMENT = "original_document"
+    TRANSLATED_MARKDOWN = "translated_markdown"
+    REWRITED_MARKDOWN = "rewrited_markdown"
+    PODCAST_SCRIPT = "podcast_script"
+
+    def file_postfix(self, locale: str = DEFAULT_LOCALE) -> str:
+        if self == CacheType.ORIGINAL_MARKDOWN:
+            return ".md"
+        elif self == CacheType.ORIGINAL_DOCUMENT:
+            return "_segments.json"
+        elif self == CacheType.TRANSLATED_MARKDOWN:
+            return f"_{locale}.md"
+        elif self == CacheType.REWRITED_MARKDOWN:
+            return f"_{locale}_rewrite.md"
+        elif self == CacheType.PODCAST_SCRIPT:
+            return "_podcast.json"
+
+class ArtifactRef(BaseModel):
+    """
+    Reference to a cached artifact of the video being run, identified by the hash of its content.
+
+    The graph state only carries these, nodes load the content they need with `load_artifact`.
+    """
+    type: CacheType
+    locale: str = DEFAULT_LOCALE
+    sha1: str
 
 class State(BaseModel):
     """
     State for the WWDC translator agent.
     """
-    markdown: str | None = Field(None, description="The generated markdown content from the video.")
-    translated_markdown: str | None = Field(None, description="The translated markdown content.")
-    rewrited_markdown: str | None = Field(None, description="The rewritten markdown content.")
-    podcast_script: str | None = Field(None, description="The podcast script.")
+    markdown: ArtifactRef | None = Field(None, description="The generated markdown content from the video.")
+    document: ArtifactRef | None = Field(None, description="The markdown split into translatable and passthrough segments.")
+    translated_markdown: ArtifactRef | None = Field(None, description="The translated markdown content in the first target locale.")
+    rewrited_markdown: ArtifactRef | None = Field(None, description="The rewritten markdown content in the first target locale.")
+    translations: Dict[str, ArtifactRef] = Field(default_factory=dict, description="The translated markdown content by target locale.")
+    rewrites: Dict[str, ArtifactRef] = Field(default_factory=dict, description="The rewritten markdown content by target locale.")
+    podcast_script: ArtifactRef | None = Field(None, description="The podcast script.")
 
 class Configuration(BaseModel):
     """Configurable parameters for the agent.
@@ -31,168 +101,592 @@ class Configuration(BaseModel):
     year: str = Field(..., description="The year of the WWDC video.")
     video_id: str = Field(..., description="The ID of the WWDC video.")
     use_cache: bool = Field(True, description="Whether to use cache.")
+    locales: list[str] = Field([DEFAULT_LOCALE], description="Target locales (e.g. zh, ja, ko), translated and rewritten in parallel from one crawl. The first one is also used for the podcast script.")
+    max_concurrent_locales: int = Field(2, description="Maximum number of locales translated or rewritten at the same time per video.")
+    write_podcast_script: bool = Field(False, description="Whether the podcast script is written after the rewrite (and by the streaming pipeline). `WWDC_PODCAST=1` turns it on for the bots.")
+    podcast_map_reduce: bool = Field(False, description="Whether the podcast script is written from per-chapter summaries, made in parallel and cached, instead of the whole translation.")
+    max_concurrent_chunks: int = Field(4, description="Maximum number of chapter chunks in flight per video in the streaming pipeline.")
+    use_translation_memory: bool = Field(True, description="Whether to reuse translated sentences from the translation memory.")
+    related_sessions: int = Field(0, description="Number of related chapters from other sessions given to the rewriter as context, 0 to disable.")
+    glossary_path: str | None = Field(None, description="Optional JSON file of `{term: translation}` merged into the translation memory glossary.")
 
     base_url: str = Field(..., description="The base URL of the OpenAI API.")
     model: str = Field(..., description="The model to use.")
     api_key: str = Field(..., description="The API key to use.")
+    max_in_flight: int | None = Field(None, description="Calls in flight above which the model counts as saturated and the fallback endpoint is used.")
+    routes: list[ModelRoute] = Field([], description="Routing rules picking a model per stage, size and content type. The first matching rule wins; calls matching no rule use `model`.")
 
-class CacheType(Enum):
-    ORIGINAL_MARKDOWN = "original_markdown"
-    TRANSLATED_MARKDOWN = "translated_markdown"
-    REWRITED_MARKDOWN = "rewrited_markdown"
-    PODCAST_SCRIPT = "podcast_script"
+    fallback_base_url: str | None = Field(None, description="The base URL of the fallback endpoint, defaults to `base_url`.")
+    fallback_model: str | None = Field(None, description="The model used when the routed endpoint is saturated or rate limited.")
+    fallback_api_key: str | None = Field(None, description="The API key of the fallback endpoint, defaults to `api_key`.")
 
-    def file_postfix(self) -> str:
-        if self == CacheType.ORIGINAL_MARKDOWN:
-            return ".md"
-        elif self == CacheType.TRANSLATED_MARKDOWN:
-            return "_zh.md"
-        elif self == CacheType.REWRITED_MARKDOWN:
-            return "_zh_rewrite.md"
-        elif self == CacheType.PODCAST_SCRIPT:
-            return "_podcast.json"
+    call_timeout: float | None = Field(DEFAULT_CALL_TIMEOUT, description="Deadline in seconds of a single model call, after which the fallback endpoint is tried. None to wait forever.")
+    stage_timeout: float | None = Field(None, description="Budget in seconds for producing one stage of a video, including follow-up calls. None for no budget.")
+    hedge_requests: bool = Field(False, description="Whether to send a duplicate of slow calls to the fallback endpoint (or the same one) and take whichever answers first.")
+    hedge_delay: float = Field(DEFAULT_HEDGE_DELAY, description="Seconds before a call is hedged while its route has too few samples for a p95 latency.")
+    output_repairs: int = Field(DEFAULT_OUTPUT_REPAIRS, description="Follow-up calls allowed per answer that is truncated (continued from where it stopped) or malformed (requested again), 0 to keep answers as they are.")
+
+    profile: bool = Field(False, description="Whether to sample the nodes into a flamegraph-compatible `.folded` file per video under `output/wwdc/profiles`. `WWDC_PROFILE=sample|cprofile` turns it on for every run.")
+
+TRANSLATION_MEMORY_PATH = os.path.join(OUTPUT_BASE_DIR, 'translation_memory.sqlite3')
+SEARCH_INDEXED_TYPES = (CacheType.ORIGINAL_MARKDOWN, CacheType.TRANSLATED_MARKDOWN, CacheType.REWRITED_MARKDOWN)
 
-OUTPUT_BASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'output', 'wwdc')
+# how the prompts name each target locale, other locales are named by their code
+LANGUAGES = {
+    'zh': '简体中文 (zh-CN)',
+    'zh-Hant': '繁体中文 (zh-TW)',
+    'en': '英语 (en-US)',
+    'ja': '日语 (ja-JP)',
+    'ko': '韩语 (ko-KR)',
+}
 
-async def get_cache(year: str, video_id: str, type: CacheType) -> str | None:
-    path = os.path.join(OUTPUT_BASE_DIR, year, f'{video_id}{type.file_postfix()}')
-    if os.path.exists(path):
+def language_name(locale: str) -> str:
+    return LANGUAGES.get(locale, locale)
+
+def get_locales(config: RunnableConfig) -> list[str]:
+    return config['configurable'].get("locales") or [DEFAULT_LOCALE]
+
+async def for_each_locale(config: RunnableConfig, run: Callable[[str], Awaitable[T]]) -> Dict[str, T]:
+    """Run `run` for every target locale concurrently, at most `max_concurrent_locales` at a time."""
+    semaphore = asyncio.Semaphore(config['configurable'].get("max_concurrent_locales", 2))
+    async def limited(locale: str) -> T:
+        async with semaphore:
+            return await run(locale)
+    locales = get_locales(config)
+    return dict(zip(locales, await asyncio.gather(*[limited(locale) for locale in locales])))
+
+def get_search_index() -> SearchIndex:
+    return SearchIndex(os.path.join(OUTPUT_BASE_DIR, 'search_index.sqlite3'))
+
+def similarity_index_path() -> str:
+    return os.path.join(OUTPUT_BASE_DIR, 'similarity_index.npz')
+
+def cache_path(year: str, video_id: str, type: CacheType, locale: str = DEFAULT_LOCALE) -> str:
+    return os.path.join(OUTPUT_BASE_DIR, year, f'{video_id}{type.file_postfix(locale)}')
+
+async def get_cache(year: str, video_id: str, type: CacheType, newer_than: float | None = None,
+                    locale: str = DEFAULT_LOCALE) -> str | None:
+    """Read a cached artifact, optionally only if it was written after the `newer_than` timestamp."""
+    path = cache_path(year, video_id, type, locale)
+    try:
+        if newer_than is not None and os.path.getmtime(path) < newer_than:
+            return None
         async with aiofiles.open(path, 'r') as f:
             if content := await f.read():
                 return content
+    except FileNotFoundError:
+        pass
     return None
 
-async def save_cache(year: str, video_id: str, type: CacheType, content: str):
-    # ensure output dir exists
-    outputdir = os.path.join(OUTPUT_BASE_DIR, year)
-    if not os.path.exists(outputdir):
-        loop = asyncio.get_running_loop()
-        await loop.run_in_executor(None, os.makedirs, outputdir)
-    # save cache
-    path = os.path.join(OUTPUT_BASE_DIR, year, f'{video_id}{type.file_postfix()}')
-    async with aiofiles.open(path, 'w') as f:
-        await f.write(content)
-
-def get_llm_model(config: Configuration) -> ChatOpenAI:
-    return ChatOpenAI(
-        model=config['configurable']["model"],
-        base_url=config['configurable']["base_url"],
-        api_key=config['configurable']["api_key"]
+async def write_atomic(path: str, content: str):
+    """Write `content` to a temp file renamed over `path`, so readers never see a partial write."""
+    await asyncio.to_thread(os.makedirs, os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.{uuid.uuid4().hex}.tmp'
+    try:
+        async with aiofiles.open(tmp_path, 'w') as f:
+            await f.write(content)
+        await asyncio.to_thread(os.replace, tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+async def save_cache(year: str, video_id: str, type: CacheType, content: str, locale: str = DEFAULT_LOCALE):
+    await write_atomic(cache_path(year, video_id, type, locale), content)
+    # keep the full-text search index in step with the cache
+    if type in SEARCH_INDEXED_TYPES:
+        kind = artifact_kind(type.value, locale)
+        try:
+            await asyncio.to_thread(get_search_index().index_artifact, year, video_id, kind, content)
+        except sqlite3.Error as e:
+            print(f"Failed to index {year} {video_id} {kind}: {e}", file=sys.stderr)
+    if type == CacheType.ORIGINAL_MARKDOWN:
+        # numpy is only loaded once a session is actually crawled
+        from src.tools.similarity_index import update_session
+        try:
+            # the whole index is rewritten, other processes crawling at the same time must wait
+            async with file_lock(f'{similarity_index_path()}.lock'):
+                await asyncio.to_thread(update_session, similarity_index_path(), year, video_id, content)
+        except Exception as e:
+            print(f"Failed to add {year} {video_id} to the similarity index: {e!r}", file=sys.stderr)
+
+@asynccontextmanager
+async def stage_lock(year: str, video_id: str, *types: CacheType, locale: str = DEFAULT_LOCALE) -> AsyncIterator[bool]:
+    """
+    Hold the cross-process locks of the given stages of a video, always taken in `CacheType` order.
+
+    Yields whether any of them was held by another run while waiting.
+    """
+    async with AsyncExitStack() as stack:
+        waited = False
+        for type in sorted(set(types), key=list(CacheType).index):
+            lock_path = os.path.join(OUTPUT_BASE_DIR, year, '.locks', f'{video_id}{type.file_postfix(locale)}.lock')
+            waited |= await stack.enter_async_context(file_lock(lock_path))
+        yield waited
+
+async def run_stage(config: RunnableConfig, type: CacheType, produce: Callable[[], Awaitable[str]],
+                    locale: str = DEFAULT_LOCALE) -> str:
+    """
+    Return the cached result of a stage, or produce and cache it.
+
+    Only one run per `(year, video_id, stage)` produces at a time, across processes. Runs that
+    arrive meanwhile wait for it and reuse its result, even with `use_cache` off as long as the
+    result was written after they started.
+    """
+    year = config['configurable']["year"]
+    video_id = config['configurable']["video_id"]
+    use_cache = config['configurable']["use_cache"]
+    if use_cache and (content := await get_cache(year, video_id, type, locale=locale)):
+        return content
+    started = time.time()
+    async with stage_lock(year, video_id, type, locale=locale) as waited:
+        if use_cache or waited:
+            if content := await get_cache(year, video_id, type, newer_than=None if use_cache else started, locale=locale):
+                print(f"Reusing {type.value} ({locale}) of {year} {video_id} from a concurrent run.")
+                return content
+        content = await within_budget(config, produce(), f"{type.value} ({locale}) of {year} {video_id}")
+        await save_cache(year, video_id, type, content, locale)
+        return content
+
+async def within_budget(config: RunnableConfig, awaitable: Awaitable[T], what: str) -> T:
+    """Await a stage under the `stage_timeout` budget, failing with a TimeoutError once it runs out."""
+    if not (budget := config['configurable'].get("stage_timeout")):
+        return await awaitable
+    try:
+        return await asyncio.wait_for(awaitable, budget)
+    except asyncio.TimeoutError:
+        raise asyncio.TimeoutError(f"{what} exceeded its stage budget of {budget}s") from None
+
+# contents of recently referenced artifacts by sha1, so consecutive nodes rarely read them back from disk
+_artifacts: "OrderedDict[str, str]" = OrderedDict()
+ARTIFACT_MEMORY_SIZE = 128
+
+def _remember(sha1: str, content: str):
+    _artifacts[sha1] = content
+    _artifacts.move_to_end(sha1)
+    while len(_artifacts) > ARTIFACT_MEMORY_SIZE:
+        _artifacts.popitem(last=False)
+
+def artifact_ref(type: CacheType, content: str, locale: str = DEFAULT_LOCALE) -> ArtifactRef:
+    """Reference an artifact that has just been cached."""
+    sha1 = hashlib.sha1(content.encode('utf-8')).hexdigest()
+    _remember(sha1, content)
+    return ArtifactRef(type=type, locale=locale, sha1=sha1)
+
+async def load_artifact(config: RunnableConfig, ref: ArtifactRef | None) -> str | None:
+    """Load the content of an artifact referenced by the state."""
+    if ref is None:
+        return None
+    if (content := _artifacts.get(ref.sha1)) is not None:
+        return content
+    year = config['configurable']["year"]
+    video_id = config['configurable']["video_id"]
+    if (content := await get_cache(year, video_id, ref.type, locale=ref.locale)) is None:
+        raise ValueError(f"{ref.type.value} ({ref.locale}) of {year} {video_id} is missing from the cache.")
+    if hashlib.sha1(content.encode('utf-8')).hexdigest() != ref.sha1:
+        # regenerated by a concurrent run in the meantime, its result is as good as ours
+        print(f"{ref.type.value} ({ref.locale}) of {year} {video_id} changed since it was referenced.", file=sys.stderr)
+    _remember(ref.sha1, content)
+    return content
+
+async def load_document(state: State, config: RunnableConfig) -> MarkdownDocument:
+    """Load the segmented source document, recovering it from the markdown for older caches."""
+    if data := await load_artifact(config, state.document):
+        return MarkdownDocument.from_dict(json.loads(data))
+    return MarkdownDocument.from_markdown(await load_artifact(config, state.markdown) or '')
+
+def once(load: Callable[[], Awaitable[T]]) -> Callable[[], Awaitable[T]]:
+    """Wrap `load` so that concurrent and later calls share the result of its first call."""
+    task: asyncio.Future | None = None
+    async def shared() -> T:
+        nonlocal task
+        if task is None:
+            task = asyncio.ensure_future(load())
+        return await asyncio.shield(task)
+    return shared
+
+@functools.lru_cache(maxsize=16)
+def _chat_model(model: str, base_url: str, api_key: str) -> "ChatOpenAI":
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(model=model, base_url=base_url, api_key=api_key)
+
+def get_llm_model(config: Configuration) -> "ChatOpenAI":
+    """The chat model of an endpoint, kept per endpoint so long-running processes reuse warm connections."""
+    return _chat_model(
+        config['configurable']["model"],
+        config['configurable']["base_url"],
+        config['configurable']["api_key"]
     )
 
+async def run_agent(config: RunnableConfig, prompt: str, content: str) -> str:
+    """Send `content` to a single-turn agent and return the final message."""
+    from langgraph.prebuilt import create_react_agent
+    model = get_llm_model(config)
+    agent = create_react_agent(model=model, tools=[], prompt=prompt)
+    response = await agent.ainvoke({
+        "messages": [{
+            "role": "user",
+            "content": content
+        }]
+    })
+    message = response["messages"][-1]
+    return Completion(message.content, message.response_metadata.get("finish_reason"))
+
+@dataclass
+class LLMRequest:
+    """
+    A single prompt/content call to the model and how to turn its answer into the stage result.
+
+    `finish` returns the final result, or a follow-up request when the answer could not be used.
+    Live runs resolve requests one by one with `resolve_request`, batch runs submit them together.
+    `stage` is matched against the routing rules.
+    """
+    prompt: str
+    content: str
+    finish: Callable[[str], Awaitable[Union[str, 'LLMRequest']]]
+    stage: str | None = None
+
+async def call_endpoints(config: RunnableConfig, endpoints: list[Endpoint], request: LLMRequest) -> str:
+    """
+    Send a request to the first endpoint, recording its latency, and to the next one when it
+    is overloaded, rate limited or misses the `call_timeout` deadline.
+    """
+    timeout = config['configurable'].get("call_timeout", DEFAULT_CALL_TIMEOUT)
+    for attempt, endpoint in enumerate(endpoints):
+        started = time.perf_counter()
+        try:
+            with in_flight(endpoint):
+                content = await asyncio.wait_for(
+                    run_agent(endpoint.apply(config), request.prompt, request.content), timeout)
+        except asyncio.TimeoutError:
+            metrics.record(endpoint.name, time.perf_counter() - started, ok=False)
+            metrics.count(endpoint.name, "timeouts")
+            if attempt + 1 == len(endpoints):
+                raise asyncio.TimeoutError(f"{endpoint.name} did not answer within {timeout}s") from None
+            print(f"{endpoint.name} did not answer within {timeout}s, falling back to {endpoints[attempt + 1].name}.", file=sys.stderr)
+        except Exception as e:
+            metrics.record(endpoint.name, time.perf_counter() - started, ok=False)
+            if not is_saturated_error(e) or attempt + 1 == len(endpoints):
+                raise
+            print(f"{endpoint.name} is saturated ({e}), falling back to {endpoints[attempt + 1].name}.", file=sys.stderr)
+        else:
+            metrics.record(endpoint.name, time.perf_counter() - started)
+            return content
+        metrics.count(endpoints[attempt + 1].name, "fallbacks")
+
+def hedge_delay(config: RunnableConfig, endpoint: Endpoint) -> float:
+    """The p95 latency of the endpoint once there are enough samples, the configured delay until then."""
+    delay = config['configurable'].get("hedge_delay", DEFAULT_HEDGE_DELAY)
+    if len(metrics.latencies.get(endpoint.name, ())) >= HEDGE_MIN_SAMPLES:
+        delay = metrics.percentile(endpoint.name, 0.95)
+    return delay
+
+async def call_model(config: RunnableConfig, request: LLMRequest) -> str:
+    """
+    Send a request to the endpoint picked by the routing rules.
+
+    The fallback endpoint is used instead when the routed one has no free capacity, and is
+    retried when the routed one is overloaded, rate limited or too slow. With `hedge_requests`,
+    a call still running after the p95 latency of its route is duplicated to the fallback
+    endpoint (or the same one), the first answer wins and the other call is cancelled.
+    """
+    endpoints = by_availability(select_endpoints(config, request.stage, request.content))
+    if not config['configurable'].get("hedge_requests", False):
+        return await call_endpoints(config, endpoints, request)
+
+    primary = asyncio.create_task(call_endpoints(config, endpoints, request))
+    tasks = {primary}
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=hedge_delay(config, endpoints[0]))
+        if not done:
+            hedge_endpoints = endpoints[1:] or endpoints
+            metrics.count(hedge_endpoints[0].name, "hedges")
+            tasks.add(asyncio.create_task(call_endpoints(config, hedge_endpoints, request)))
+        while True:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is not primary:
+                        metrics.count(hedge_endpoints[0].name, "hedge_wins")
+                    return task.result()
+            if not tasks:
+                # every call failed, report the original one
+                return primary.result()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+def checked(config: RunnableConfig, request: LLMRequest, source: str, headings: bool = True) -> LLMRequest:
+    """
+    Checks the answer to `request` against the structure of its `source` markdown before `finish`.
+
+    A truncated answer is completed with a continuation call asking only for the rest, from its
+    last complete paragraph; any other broken answer is requested again. Up to `output_repairs`
+    follow-ups are made, after which the answer is used as it is.
+    """
+    async def check(output: str, finish_reason: str | None, repairs: int) -> Union[str, LLMRequest]:
+        result = check_output(source, output, finish_reason, headings)
+        if result.ok:
+            return await request.finish(output)
+        if not repairs:
+            print(f"Answer still incomplete ({', '.join(result.problems)}), keeping it.", file=sys.stderr)
+            return await request.finish(output)
+
+        if not result.truncated:
+            print(f"Answer is malformed ({', '.join(result.problems)}), requesting it again.", file=sys.stderr)
+            async def retry(content: str) -> Union[str, LLMRequest]:
+                return await check(content, getattr(content, "finish_reason", None), repairs - 1)
+            return LLMRequest(request.prompt, request.content, retry, stage=request.stage)
+
+        print(f"Answer is truncated ({', '.join(result.problems)}), requesting the rest.", file=sys.stderr)
+        answered = continuation_point(output)
+        prompt = await get_prompt(AgentType.CONTINUATION, prompt=request.prompt)
+        async def resume(content: str) -> Union[str, LLMRequest]:
+            return await check(f"{answered}\n\n{content.strip()}", getattr(content, "finish_reason", None), repairs - 1)
+        return LLMRequest(prompt, f"{request.content}\n\n# 已输出部分的结尾\n{answered[-CONTINUATION_CONTEXT:]}",
+                          resume, stage=request.stage)
+
+    async def finish(content: str) -> Union[str, LLMRequest]:
+        return await check(content, getattr(content, "finish_reason", None),
+                           config['configurable'].get("output_repairs", DEFAULT_OUTPUT_REPAIRS))
+    return LLMRequest(request.prompt, request.content, finish, stage=request.stage)
+
+async def resolve_request(config: RunnableConfig, request: Union[str, LLMRequest]) -> str:
+    """Run a request (and any follow-ups) against the model until it yields a result."""
+    while isinstance(request, LLMRequest):
+        content = await call_model(config, request)
+        request = await request.finish(content)
+    return request
+
+async def prepare_translation(markdown: str, document: MarkdownDocument, config: RunnableConfig,
+                              locale: str = DEFAULT_LOCALE) -> Union[str, LLMRequest]:
+    """
+    Prepare the translation of `markdown` into `locale`.
+
+    With the translation memory enabled, known sentences are served locally and only unseen
+    sentences are requested; the result is returned directly when nothing is left to translate.
+    Sentences missing from the model response (e.g. a truncated one) are requested again on
+    their own, up to `output_repairs` times, before a whole-document translation is requested instead.
+    """
+    # only translatable text goes to the model, code and link lists are spliced back afterwards
+    source = document.prompt_text(markdown)
+
+    async def translate_document() -> LLMRequest:
+        prompt = await get_prompt(AgentType.WWDC_TRANSLATOR, language=language_name(locale))
+        async def finish(content: str) -> str:
+            return document.splice(content)
+        return checked(config, LLMRequest(prompt, source, finish, stage="translate"), source)
+
+    if not config['configurable'].get("use_translation_memory", True):
+        return await translate_document()
+
+    memory = await asyncio.to_thread(TranslationMemory, TRANSLATION_MEMORY_PATH, locale)
+    if glossary_path := config['configurable'].get("glossary_path"):
+        await asyncio.to_thread(memory.load_glossary_file, glossary_path)
+
+    segmented = SegmentedMarkdown.parse(source)
+    segments = segmented.segments()
+    translations = await asyncio.to_thread(memory.lookup, segments)
+
+    pending = list({segment_key(segment): segment for segment in segments
+                    if segment_key(segment) not in translations}.values())
+    print(f"Translation memory ({locale}): {len(segments) - len(pending)}/{len(segments)} segments reused.")
+    if not pending:
+        return document.splice(segmented.render(translations))
+
+    glossary = await asyncio.to_thread(memory.glossary)
+    prompt = await get_prompt(AgentType.WWDC_SEGMENT_TRANSLATOR, language=language_name(locale), glossary=format_glossary(glossary))
+
+    def request_segments(segments: list[str], repairs: int) -> LLMRequest:
+        async def finish(content: str) -> Union[str, LLMRequest]:
+            translated = parse_segments_response(content, len(segments))
+            if getattr(content, "finish_reason", None) == "length" and translated:
+                # the last segment of a truncated answer may stop mid-sentence
+                del translated[max(translated)]
+            if pairs := [(segments[index], text) for index, text in translated.items()]:
+                await asyncio.to_thread(memory.store, pairs)
+                translations.update({segment_key(source): target for source, target in pairs})
+            if not (missing := [segment for index, segment in enumerate(segments) if index not in translated]):
+                return document.splice(segmented.render(translations))
+            if repairs:
+                print(f"Translation memory: {len(missing)} segments missing from response, requesting only those.")
+                return request_segments(missing, repairs - 1)
+            print(f"Translation memory: {len(missing)} segments missing from response, falling back.")
+            return await translate_document()
+        return LLMRequest(prompt, format_segments_request(segments), finish, stage="translate")
+
+    # answers cut short are completed with the missing segments only, see `checked`
+    return request_segments(pending, config['configurable'].get("output_repairs", DEFAULT_OUTPUT_REPAIRS))
+
+async def prepare_rewrite(translated_markdown: str, document: MarkdownDocument, config: RunnableConfig,
+                          part: tuple[int, int] | None = None, locale: str = DEFAULT_LOCALE) -> LLMRequest:
+    """Prepare the rewrite of a translation into `locale`, or of one chapter `part=(index, total)` of it."""
+    if part:
+        prompt = await get_prompt(AgentType.CHAPTER_WRITER, index=part[0] + 1, total=part[1], language=language_name(locale))
+    else:
+        prompt = await get_prompt(AgentType.WRITER, language=language_name(locale))
+    source = content = document.prompt_text(translated_markdown)
+    if k := config['configurable'].get("related_sessions", 0):
+        content += await related_context(document, config, k)
+    async def finish(content: str) -> str:
+        return document.splice(content)
+    # a chapter keeps its headings, the whole-document writer is free to restructure them
+    return checked(config, LLMRequest(prompt, content, finish, stage="rewrite"), source, headings=part is not None)
+
+async def related_context(document: MarkdownDocument, config: RunnableConfig, k: int) -> str:
+    """Short excerpts of the `k` most similar chapters from other sessions, appended to the rewriter input."""
+    from src.tools.similarity_index import related_chapters
+    if not os.path.exists(similarity_index_path()):
+        return ""
+    year = config['configurable']["year"]
+    video_id = config['configurable']["video_id"]
+    related = await asyncio.to_thread(
+        related_chapters, similarity_index_path(), document.prompt_text(placeholders=False), k, (year, video_id))
+    if not related:
+        return ""
+    excerpts = "\n".join(
+        f"- [WWDC{chapter['year']} {chapter['title']}]({chapter['url']}): {chapter['excerpt']}" for chapter in related)
+    return f"\n\n# 参考资料\n以下是其他 WWDC 演讲中的相关片段，仅可用于补充背景或推荐延伸阅读，不得当作本演讲的内容：\n{excerpts}"
+
+def summary_path(key: str) -> str:
+    # a dot-directory, so nothing walking the `<year>/` directories mistakes it for a year
+    return os.path.join(OUTPUT_BASE_DIR, '.chapter_summaries', f'{key}.md')
+
+async def summarize_chapter(config: RunnableConfig, prompt: str, chapter: str) -> str:
+    """Summary of one chapter, cached by the hash of the chapter and the summarizer prompt."""
+    path = summary_path(hashlib.sha1(f'{prompt}\0{chapter}'.encode('utf-8')).hexdigest())
+    try:
+        async with aiofiles.open(path, 'r') as f:
+            if summary := await f.read():
+                return summary
+    except FileNotFoundError:
+        pass
+    async def finish(content: str) -> str:
+        return content.strip()
+    summary = await resolve_request(config, LLMRequest(prompt, chapter, finish, stage="summarize"))
+    await write_atomic(path, summary)
+    return summary
+
+async def summarize_chapters(config: RunnableConfig, chapters: list[MarkdownDocument]) -> str:
+    """The chapters summarized in parallel, each under its own heading."""
+    prompt = await get_prompt(AgentType.CHAPTER_SUMMARIZER)
+    semaphore = asyncio.Semaphore(config['configurable'].get("max_concurrent_chunks", 4))
+
+    async def summarize(chapter: MarkdownDocument) -> str:
+        text = chapter.to_markdown()
+        heading = text.split('\n', 1)[0] if text.startswith('#') else ''
+        async with semaphore:
+            summary = await summarize_chapter(config, prompt, text)
+        return f"{heading}\n\n{summary}".strip()
+
+    return '\n\n'.join(await asyncio.gather(*[summarize(chapter) for chapter in chapters]))
+
+async def prepare_podcast_script(translated_markdown: str, document: MarkdownDocument, config: RunnableConfig) -> LLMRequest:
+    """
+    Prepare the podcast script of a translation.
+
+    With `podcast_map_reduce`, the chapters are summarized first (each summary is cached, so
+    changing the podcast prompt only reruns the final call) and the script is written from the
+    summaries instead of the whole translation. The summaries are requested right away, batch
+    runs turn map-reduce off.
+    """
+    # the podcast only talks about the content, code and link lists are left out entirely
+    prompt = await get_prompt(AgentType.PODCAST_SCRIPT_WRITER)
+    content = document.prompt_text(translated_markdown, placeholders=False)
+    if config['configurable'].get("podcast_map_reduce", False):
+        chapters = MarkdownDocument.from_markdown(content).split_chapters()
+        if len(chapters) > 1:
+            content = await summarize_chapters(config, chapters)
+    async def finish(content: str) -> str:
+        return content
+    return LLMRequest(prompt, content, finish, stage="podcast")
+
 # Nodes:
 
+@profiled
 async def crawl_wwdc_markdown(state: State, config: RunnableConfig) -> Dict[str, Any]:
     """Generate markdown content from WWDC video data."""
 
     year=config['configurable']["year"]
     video_id=config['configurable']["video_id"]
-    if config['configurable']["use_cache"]:
-        if markdown := await get_cache(year, video_id, CacheType.ORIGINAL_MARKDOWN):
-            return {
-                "markdown": markdown
-            }
-
-    task = WWDCTask(year=year, video_id=video_id)
-    if markdown := await asyncio.to_thread(lambda: task.run()):
-        await save_cache(year, video_id, CacheType.ORIGINAL_MARKDOWN, markdown)
-        return {
-            "markdown": markdown
-        }
-    else:
-        raise ValueError("No markdown content available for translation.")
+    segments = None
 
-async def translate_markdown(state: State, config: RunnableConfig) -> Dict[str, Any]:
-    """Translate markdown content."""
-    year=config['configurable']["year"]
-    video_id=config['configurable']["video_id"]
+    async def crawl() -> str:
+        nonlocal segments
+        task = WWDCTask(year=year, video_id=video_id)
+        if not (document := await asyncio.to_thread(profile_call, config, "crawl", task.run_document)):
+            raise ValueError("No markdown content available for translation.")
+        if session := await asyncio.to_thread(task.read_session):
+            chapters = [(chapter.title, chapter.start_time) for chapter in session.chapters]
+            await asyncio.to_thread(get_search_index().record_chapter_times, year, video_id, chapters)
+        # the segments are saved first, so whoever sees the markdown also finds its segments
+        segments = json.dumps(document.to_dict(), ensure_ascii=False)
+        await save_cache(year, video_id, CacheType.ORIGINAL_DOCUMENT, segments)
+        return document.to_markdown()
 
-    if config['configurable']["use_cache"]:
-        if translated_markdown := await get_cache(year, video_id, CacheType.TRANSLATED_MARKDOWN):
-            return {
-                **state.model_dump(),
-                "translated_markdown": translated_markdown
-            }
+    markdown = await run_stage(config, CacheType.ORIGINAL_MARKDOWN, crawl)
+    if segments is None:
+        segments = await get_cache(year, video_id, CacheType.ORIGINAL_DOCUMENT)
+    return {
+        "markdown": artifact_ref(CacheType.ORIGINAL_MARKDOWN, markdown),
+        "document": artifact_ref(CacheType.ORIGINAL_DOCUMENT, segments) if segments else None
+    }
 
-    prompt = await get_prompt(AgentType.WWDC_TRANSLATOR)
-    model = get_llm_model(config)
-    agent = create_react_agent(model=model, tools=[], prompt=prompt)
-    
-    if markdown := state.markdown:
-        response = await agent.ainvoke({
-            "messages": [{
-                "role": "user",
-                "content": markdown
-            }]
-        })
-        translated_markdown = response["messages"][-1].content
-        await save_cache(year, video_id, CacheType.TRANSLATED_MARKDOWN, translated_markdown)
-        return {
-            **state.model_dump(),
-            "translated_markdown": translated_markdown
-        }
-    else:
+@profiled
+async def translate_markdown(state: State, config: RunnableConfig) -> Dict[str, Any]:
+    """Translate markdown content into every target locale."""
+    if not state.markdown:
         raise ValueError("No markdown content available for translation.")
+    # the source is loaded and segmented once, and only if some locale is not cached
+    load_source = once(lambda: asyncio.gather(load_artifact(config, state.markdown), load_document(state, config)))
+
+    async def translate(locale: str) -> ArtifactRef:
+        async def produce() -> str:
+            markdown, document = await load_source()
+            request = await prepare_translation(markdown, document, config, locale)
+            return await resolve_request(config, request)
+        return artifact_ref(CacheType.TRANSLATED_MARKDOWN, await run_stage(config, CacheType.TRANSLATED_MARKDOWN, produce, locale), locale)
 
+    translations = await for_each_locale(config, translate)
+    return {
+        "translated_markdown": translations[get_locales(config)[0]],
+        "translations": translations
+    }
+
+@profiled
 async def rewrite_markdown(state: State, config: RunnableConfig) -> Dict[str, Any]:
-    """Rewrite markdown content."""
-    year=config['configurable']["year"]
-    video_id=config['configurable']["video_id"]
-    if config['configurable']["use_cache"]:
-        if rewrited_markdown := await get_cache(year, video_id, CacheType.REWRITED_MARKDOWN):
-            return {
-                **state.model_dump(),
-                "rewrited_markdown": rewrited_markdown
-            }
-
-    prompt = await get_prompt(AgentType.WRITER)
-    model = get_llm_model(config)
-    agent = create_react_agent(model=model, tools=[], prompt=prompt)
+    """Rewrite markdown content in every target locale."""
+    load_document_once = once(lambda: load_document(state, config))
 
-    if translated_markdown := state.translated_markdown:
-        response = await agent.ainvoke({
-            "messages": [{
-                "role": "user",
-                "content": translated_markdown
-            }]
-        })
-        rewrited_markdown = response["messages"][-1].content
-        await save_cache(year, video_id, CacheType.REWRITED_MARKDOWN, rewrited_markdown)
-        return {
-            **state.model_dump(),
-            "rewrited_markdown": rewrited_markdown
-        }
-    else:
-        raise ValueError("No markdown content available for translation.")
+    async def rewrite(locale: str) -> ArtifactRef:
+        async def produce() -> str:
+            if not (translated_markdown := await load_artifact(config, state.translations.get(locale))):
+                raise ValueError("No markdown content available for translation.")
+            request = await prepare_rewrite(translated_markdown, await load_document_once(), config, locale=locale)
+            return await resolve_request(config, request)
+        return artifact_ref(CacheType.REWRITED_MARKDOWN, await run_stage(config, CacheType.REWRITED_MARKDOWN, produce, locale), locale)
 
+    rewrites = await for_each_locale(config, rewrite)
+    return {
+        "rewrited_markdown": rewrites[get_locales(config)[0]],
+        "rewrites": rewrites
+    }
+
+@profiled
 async def write_podcast_script(state: State, config: RunnableConfig) -> Dict[str, Any]:
     """Write podcast script."""
-    year=config['configurable']["year"]
-    video_id=config['configurable']["video_id"]
-    if config['configurable']["use_cache"]:
-        if podcast_script := await get_cache(year, video_id, CacheType.PODCAST_SCRIPT):
-            return {
-                **state.model_dump(),
-                "podcast_script": podcast_script
-            }
-    prompt = await get_prompt(AgentType.PODCAST_SCRIPT_WRITER)
-    model = get_llm_model(config)
-    agent = create_react_agent(model=model, tools=[], prompt=prompt)
-    if markdown := state.translated_markdown:
-        response = await agent.ainvoke({
-            "messages": [{
-                "role": "user",
-                "content": markdown
-            }]
-        })
-        podcast_script = response["messages"][-1].content
-        await save_cache(year, video_id, CacheType.PODCAST_SCRIPT, podcast_script)
-        return {
-            **state.model_dump(),
-            "podcast_script": podcast_script
-        }
-    else:
-        raise ValueError("No markdown content available for translation.")
+    async def write() -> str:
+        if not (markdown := await load_artifact(config, state.translated_markdown)):
+            raise ValueError("No markdown content available for translation.")
+        request = await prepare_podcast_script(markdown, await load_document(state, config), config)
+        return await resolve_request(config, request)
+
+    return {
+        "podcast_script": artifact_ref(CacheType.PODCAST_SCRIPT, await run_stage(config, CacheType.PODCAST_SCRIPT, write))
+    }
+
+def after_rewrite(state: State, config: RunnableConfig) -> str:
+    return "write_podcast_script" if config['configurable'].get("write_podcast_script", False) else "__end__"
 
 # async def save_markdown(state: State, config: RunnableConfig):
 #     currentdir = os.path.dirname(os.path.abspath(__file__))
@@ -221,7 +715,7 @@ graph = (
     .add_edge("__start__", "crawl_wwdc_markdown")
     .add_edge("crawl_wwdc_markdown", "translate_markdown")
     .add_edge("translate_markdown", "rewrite_markdown")
-    .add_edge("rewrite_markdown", "__end__")
-    # .add_edge("write_podcast_script", "__end__")
+    .add_conditional_edges("rewrite_markdown", after_rewrite, ["write_podcast_script", "__end__"])
+    .add_edge("write_podcast_script", "__end__")
     .compile(name="WWDC Translator Graph")
 )
@@ -0,0 +1,285 @@
+import asyncio
+import json
+import os
+import sys
+import time
+from contextlib import AsyncExitStack
+
+from openai import AsyncOpenAI
+
+from src.agent.model_router import Endpoint, select_endpoints
+from src.agent.output_check import Completion
+from src.agent.wwdc_translator import (
+    CacheType,
+    LLMRequest,
+    State,
+    crawl_wwdc_markdown,
+    get_cache,
+    get_locales,
+    load_artifact,
+    load_document,
+    prepare_podcast_script,
+    prepare_rewrite,
+    prepare_translation,
+    save_cache,
+    stage_lock,
+)
+from src.tools.scrapy_spider.markdown_builder import MarkdownDocument
+from src.bot.wwdc_translator_bot import _generate_blog_post, _parse_video_url, _video_config
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_FINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+class BatchSubmitter:
+    """
+    Submits chat completion requests through an OpenAI-style Batch API and waits for the results.
+    """
+
+    def __init__(self, client: AsyncOpenAI, model: str, poll_interval: float = 60, completion_window: str = "24h"):
+        self.client = client
+        self.model = model
+        self.poll_interval = poll_interval
+        self.completion_window = completion_window
+
+    def build_jsonl(self, requests: dict[str, LLMRequest]) -> bytes:
+        lines = [json.dumps({
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": BATCH_ENDPOINT,
+            "body": {
+                "model": self.model,
+                "messages": [
+                    {"role": "system", "content": request.prompt},
+                    {"role": "user", "content": request.content},
+                ],
+            },
+        }, ensure_ascii=False) for custom_id, request in requests.items()]
+        return "\n".join(lines).encode("utf-8")
+
+    async def submit(self, requests: dict[str, LLMRequest]) -> dict[str, str]:
+        """Submit `requests` as one batch and return `{custom_id: content}` for every successful response."""
+        input_file = await self.client.files.create(
+            file=("wwdc_batch.jsonl", self.build_jsonl(requests)),
+            purpose="batch")
+        batch = await self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window=self.completion_window)
+        print(f"Submitted batch {batch.id} with {len(requests)} requests.")
+
+        while batch.status not in BATCH_FINAL_STATUSES:
+            await asyncio.sleep(self.poll_interval)
+            batch = await self.client.batches.retrieve(batch.id)
+            if counts := batch.request_counts:
+                print(f"Batch {batch.id} {batch.status}: {counts.completed}/{counts.total} completed, {counts.failed} failed.")
+
+        if batch.status == "failed":
+            raise RuntimeError(f"Batch {batch.id} failed: {batch.errors}")
+
+        # expired or cancelled batches still return the requests that did complete
+        results = {}
+        if batch.output_file_id:
+            output = await self.client.files.content(batch.output_file_id)
+            for line in output.text.splitlines():
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                response = item.get("response") or {}
+                if response.get("status_code") == 200:
+                    choice = response["body"]["choices"][0]
+                    results[item["custom_id"]] = Completion(choice["message"]["content"], choice.get("finish_reason"))
+                else:
+                    print(f"Batch request {item.get('custom_id')} failed: {item.get('error') or response}", file=sys.stderr)
+        return results
+
+
+# a stage of a video in one locale, the podcast script only exists for the first locale
+Stage = tuple[CacheType, str]
+
+
+class _BatchVideo:
+    def __init__(self, video: dict, year: str, video_id: str):
+        self.video = video
+        self.year = year
+        self.video_id = video_id
+        self.config = _video_config(year, video_id)
+        # the chapter summaries would be live calls outside the batch, the podcast is written in one call
+        self.config["configurable"]["podcast_map_reduce"] = False
+        self.locales = get_locales(self.config)
+        self.markdown: str | None = None
+        self.document: MarkdownDocument | None = None
+        self.results: dict[Stage, str] = {}
+        self.followups: dict[Stage, LLMRequest] = {}
+        self.failed: set[Stage] = set()
+        # the `stage_lock` of every stage with a request in flight, held until its result is saved
+        self.locks: dict[Stage, AsyncExitStack] = {}
+
+    def custom_id(self, stage: Stage) -> str:
+        type, locale = stage
+        return f"{self.year}:{self.video_id}:{type.value}:{locale}"
+
+    async def _load_or_prepare(self, stage: Stage, prepare) -> LLMRequest | None:
+        if stage in self.results or stage in self.failed:
+            return None
+        type, locale = stage
+        use_cache = self.config["configurable"]["use_cache"]
+        if use_cache and stage not in self.locks:
+            if content := await get_cache(self.year, self.video_id, type, locale=locale):
+                self.results[stage] = content
+                return None
+        if stage not in self.locks:
+            # the same single-flight as `run_stage`: a live run producing this stage meanwhile is waited for
+            started = time.time()
+            self.locks[stage] = stack = AsyncExitStack()
+            if await stack.enter_async_context(stage_lock(self.year, self.video_id, type, locale=locale)) or use_cache:
+                if content := await get_cache(self.year, self.video_id, type, newer_than=None if use_cache else started,
+                                              locale=locale):
+                    await self.release(stage)
+                    self.results[stage] = content
+                    return None
+        request = self.followups.pop(stage, None) or await prepare()
+        if isinstance(request, str):
+            await self.finish(stage, request)
+            return None
+        return request
+
+    async def pending_requests(self, include_podcast: bool) -> dict[Stage, LLMRequest]:
+        """Return the requests whose inputs are already available, loading finished stages from the cache."""
+        requests = {}
+        document = self.document
+        for locale in self.locales:
+            stage = (CacheType.TRANSLATED_MARKDOWN, locale)
+            if request := await self._load_or_prepare(
+                    stage, lambda: prepare_translation(self.markdown, document, self.config, locale)):
+                requests[stage] = request
+            if not (translated := self.results.get(stage)):
+                continue
+            stage = (CacheType.REWRITED_MARKDOWN, locale)
+            if request := await self._load_or_prepare(
+                    stage, lambda: prepare_rewrite(translated, document, self.config, locale=locale)):
+                requests[stage] = request
+            stage = (CacheType.PODCAST_SCRIPT, locale)
+            if include_podcast and locale == self.locales[0] and (request := await self._load_or_prepare(
+                    stage, lambda: prepare_podcast_script(translated, document, self.config))):
+                requests[stage] = request
+        return requests
+
+    async def finish(self, stage: Stage, result: str | LLMRequest):
+        if isinstance(result, LLMRequest):
+            self.followups[stage] = result
+        else:
+            type, locale = stage
+            try:
+                await save_cache(self.year, self.video_id, type, result, locale)
+            finally:
+                await self.release(stage)
+            self.results[stage] = result
+
+    async def fail(self, stage: Stage):
+        self.failed.add(stage)
+        await self.release(stage)
+
+    async def release(self, stage: Stage | None = None):
+        """Release the lock of `stage`, or of every stage still held."""
+        for stage in [stage] if stage else list(self.locks):
+            if stack := self.locks.pop(stage, None):
+                await stack.aclose()
+
+
+async def _crawl_videos(videos: list, max_concurrent: int) -> list[_BatchVideo]:
+    semaphore = asyncio.Semaphore(max_concurrent)
+
+    async def crawl(video) -> _BatchVideo | None:
+        if not (video_url := video.get('url', None)):
+            return None
+        try:
+            item = _BatchVideo(video, *_parse_video_url(video_url))
+            async with semaphore:
+                state = State(**await crawl_wwdc_markdown(State(), item.config))
+                item.markdown = await load_artifact(item.config, state.markdown)
+                item.document = await load_document(state, item.config)
+            return item
+        except Exception as e:
+            print(e, file=sys.stderr)
+            return None
+
+    return [item for item in await asyncio.gather(*[crawl(video) for video in videos]) if item]
+
+
+async def translate_wwdc_videos_batch_async(
+        videos: list,
+        max_concurrent=3,
+        poll_interval: float = 60,
+        include_podcast=True,
+        write_blog_posts=True,
+        client: AsyncOpenAI | None = None):
+    """
+    Translate, rewrite and write podcast scripts for `videos` through the Batch API.
+
+    Every round submits all requests whose inputs are ready as one batch, so a year needs at most
+    a few submissions (translations first, then rewrites and podcast scripts). Every locale of
+    `WWDC_LOCALES` is translated and rewritten, the podcast script is written in the first one.
+    Results are written into the same cache layout as the live graph, and cached stages are never
+    resubmitted.
+
+    Each request goes to the endpoint the `LLM_ROUTES` rules pick for it, with one batch per endpoint
+    and round. A failed request is not retried on the `LLM_FALLBACK_*` endpoint, it is submitted again
+    by the next run. `client` replaces the client of every endpoint.
+    """
+    if include_podcast and os.environ.get("WWDC_PODCAST_MAP_REDUCE") == "1":
+        print("WWDC_PODCAST_MAP_REDUCE is ignored in batch mode, podcast scripts are written from the whole translation.",
+              file=sys.stderr)
+    items = await _crawl_videos(videos, max_concurrent)
+    if not items:
+        return
+    submitters: dict[tuple[str, str, str], BatchSubmitter] = {}
+
+    def submitter_for(endpoint: Endpoint) -> BatchSubmitter:
+        key = (endpoint.model, endpoint.base_url, endpoint.api_key)
+        if key not in submitters:
+            submitters[key] = BatchSubmitter(client or AsyncOpenAI(base_url=endpoint.base_url, api_key=endpoint.api_key),
+                                             endpoint.model, poll_interval=poll_interval)
+        return submitters[key]
+
+    try:
+        while True:
+            requests: dict[str, tuple[_BatchVideo, Stage, LLMRequest]] = {}
+            for item in items:
+                for stage, request in (await item.pending_requests(include_podcast)).items():
+                    requests[item.custom_id(stage)] = (item, stage, request)
+            if not requests:
+                break
+
+            # one batch per endpoint the routing rules pick, the fallback endpoint is not used
+            batches: dict[BatchSubmitter, dict[str, LLMRequest]] = {}
+            for custom_id, (item, _, request) in requests.items():
+                endpoint = select_endpoints(item.config, request.stage, request.content)[0]
+                batches.setdefault(submitter_for(endpoint), {})[custom_id] = request
+            results = {}
+            for batch_results in await asyncio.gather(*[submitter.submit(batch) for submitter, batch in batches.items()]):
+                results.update(batch_results)
+            for custom_id, (item, stage, request) in requests.items():
+                if (content := results.get(custom_id)) is None:
+                    await item.fail(stage)
+                    continue
+                try:
+                    await item.finish(stage, await request.finish(content))
+                except Exception as e:
+                    print(f"{custom_id}: {e}", file=sys.stderr)
+                    await item.fail(stage)
+    finally:
+        # a run that stops early leaves no stage locked
+        for item in items:
+            await item.release()
+
+    for item in items:
+        if item.failed:
+            print(f"{item.year} {item.video_id} failed stages: {', '.join(f'{type.value} ({locale})' for type, locale in item.failed)}",
+                  file=sys.stderr)
+        if write_blog_posts and (CacheType.REWRITED_MARKDOWN, item.locales[0]) in item.results:
+            _generate_blog_post(item.video, item.locales[0])
+
+
+def translate_wwdc_videos_batch(videos: list, max_concurrent=3, poll_interval: float = 60):
+    asyncio.run(translate_wwdc_videos_batch_async(videos, max_concurrent=max_concurrent, poll_interval=poll_interval))
@@ -0,0 +1,193 @@
+import os
+from dataclasses import dataclass
+from typing import Callable, Dict, List
+
+from src.agent.model_router import estimate_tokens
+from src.agent.wwdc_translator import DEFAULT_LOCALE, OUTPUT_BASE_DIR, CacheType
+from src.bot.wwdc_translator_bot import _parse_video_url
+from src.tools.scrapy_spider.markdown_builder import MarkdownDocument, read_jsonl
+from src.tools.scrapy_spider.wwdc_task import WWDCTask
+
+PROMPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'prompts')
+
+# assumed output/input token ratio of each stage, used for outputs that do not exist yet
+OUTPUT_RATIOS = {
+    "translate": 1.1,
+    "rewrite": 1.3,
+    "podcast": 0.5,
+}
+STAGE_TYPES = {
+    "translate": CacheType.TRANSLATED_MARKDOWN,
+    "rewrite": CacheType.REWRITED_MARKDOWN,
+    "podcast": CacheType.PODCAST_SCRIPT,
+}
+STAGE_PROMPTS = {
+    "translate": "wwdc_translator.md",
+    "rewrite": "writer.md",
+    "podcast": "podcast_script_writer.md",
+}
+# source size assumed for sessions that are not crawled yet and nothing else is known about
+DEFAULT_SOURCE_TOKENS = 6000
+CRAWL_SECONDS = 20
+
+
+@dataclass
+class StagePlan:
+    stage: str
+    cached: int = 0
+    pending: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    # pending calls whose input size was extrapolated from other sessions
+    extrapolated: int = 0
+
+    def add(self, input_tokens: int, output_tokens: int, extrapolated: bool = False):
+        self.pending += 1
+        self.input_tokens += input_tokens
+        self.output_tokens += output_tokens
+        self.extrapolated += extrapolated
+
+
+def token_counter() -> Callable[[List[str]], List[int]]:
+    """
+    Counts tokens with tiktoken when it is installed and its encoding is available offline,
+    falling back to the `estimate_tokens` heuristic.
+    """
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return lambda texts: [estimate_tokens(text) for text in texts]
+    return lambda texts: [len(tokens) for tokens in encoding.encode_ordinary_batch(texts, num_threads=os.cpu_count() or 4)]
+
+
+def _listdir(path: str) -> set[str]:
+    try:
+        with os.scandir(path) as entries:
+            return {entry.name for entry in entries}
+    except FileNotFoundError:
+        return set()
+
+
+def _read(path: str) -> str:
+    with open(path, 'r', encoding='utf-8') as file:
+        return file.read()
+
+
+def video_ids(year: str, output_dir: str = OUTPUT_BASE_DIR) -> List[str]:
+    """
+    The sessions of a year, from the `videos.jsonl` listing saved by `script.py`, or else from the cached markdown.
+    """
+    listing = os.path.join(output_dir, year, 'videos.jsonl')
+    if os.path.exists(listing):
+        return [_parse_video_url(video['url'])[1] for video in read_jsonl(listing)[-1]['videos'] if video.get('url')]
+    return sorted(name[:-len('.md')] for name in _listdir(os.path.join(output_dir, year))
+                  if name.endswith('.md') and '_' not in name)
+
+
+def plan_year(year: str, ids: List[str], locales: List[str], include_podcast: bool = False,
+              output_dir: str = OUTPUT_BASE_DIR, crawl_dir: str = WWDCTask.OUTPUT_BASE_DIR,
+              count_tokens: Callable[[List[str]], List[int]] | None = None) -> Dict[str, StagePlan]:
+    """
+    Counts the cached and pending work of every stage for the sessions `ids` of a year.
+
+    Each directory is listed once and only the inputs of pending stages are read. Pending inputs
+    that do not exist yet (e.g. the translation a pending rewrite will start from) are estimated
+    from their own source with `OUTPUT_RATIOS`, and sources that are not crawled yet from the
+    average of the known ones. Reuse from the translation memory is not taken into account.
+    """
+    count_tokens = count_tokens or token_counter()
+    names = _listdir(os.path.join(output_dir, year))
+    crawled = _listdir(os.path.join(crawl_dir, year))
+    stages = ["translate", "rewrite", *(["podcast"] if include_podcast else [])]
+    plans = {stage: StagePlan(stage) for stage in ["crawl", *stages]}
+    prompts = [_read(os.path.join(PROMPTS_DIR, STAGE_PROMPTS[stage])) for stage in stages]
+    prompt_tokens = dict(zip(stages, count_tokens(prompts)))
+
+    def cached(video_id: str, type: CacheType, locale: str = DEFAULT_LOCALE) -> str | None:
+        name = f'{video_id}{type.file_postfix(locale)}'
+        return os.path.join(output_dir, year, name) if name in names else None
+
+    todo: List[tuple[str, List[tuple[str, str]]]] = []
+    # translatable source text of every session with pending stages, `None` if not crawled yet
+    sources: Dict[str, str | None] = {}
+    # cached translations that pending rewrites and podcasts start from
+    inputs: Dict[tuple[str, str, str], str] = {}
+    for video_id in ids:
+        if path := cached(video_id, CacheType.ORIGINAL_MARKDOWN):
+            plans["crawl"].cached += 1
+        else:
+            plans["crawl"].pending += 1
+            path = next((os.path.join(crawl_dir, year, name) for name in (f'{video_id}_cn.md', f'{video_id}_en.md')
+                         if name in crawled), None)
+
+        pending = []
+        for stage in stages:
+            # the podcast script is only written for the first locale
+            for locale in locales[:1] if stage == "podcast" else locales:
+                if cached(video_id, STAGE_TYPES[stage], locale):
+                    plans[stage].cached += 1
+                else:
+                    pending.append((stage, locale))
+        if not pending:
+            continue
+        todo.append((video_id, pending))
+        sources[video_id] = MarkdownDocument.from_markdown(_read(path)).prompt_text() if path else None
+        for stage, locale in pending:
+            if stage != "translate" and (translated := cached(video_id, CacheType.TRANSLATED_MARKDOWN, locale)):
+                inputs[(video_id, stage, locale)] = _read(translated)
+
+    known_ids = [video_id for video_id, text in sources.items() if text is not None]
+    known = dict(zip(known_ids, count_tokens([sources[video_id] for video_id in known_ids])))
+    average = round(sum(known.values()) / len(known)) if known else DEFAULT_SOURCE_TOKENS
+    input_tokens = dict(zip(inputs, count_tokens(list(inputs.values()))))
+
+    for video_id, pending in todo:
+        source_tokens = known.get(video_id, average)
+        for stage, locale in pending:
+            if stage == "translate":
+                tokens = source_tokens
+            else:
+                tokens = input_tokens.get((video_id, stage, locale)) or round(source_tokens * OUTPUT_RATIOS["translate"])
+            extrapolated = video_id not in known and (video_id, stage, locale) not in input_tokens
+            plans[stage].add(prompt_tokens[stage] + tokens, round(tokens * OUTPUT_RATIOS[stage]), extrapolated)
+    return plans
+
+
+def estimate_wall_time(plans: Dict[str, StagePlan], concurrency: int, tpm: int | None, output_tps: float) -> float:
+    """
+    Seconds to finish the plan: the slower of the token-per-minute limit and generating the
+    outputs `concurrency` calls at a time, plus the pending crawls.
+    """
+    llm_plans = [plan for plan in plans.values() if plan.stage != "crawl"]
+    total_tokens = sum(plan.input_tokens + plan.output_tokens for plan in llm_plans)
+    output_tokens = sum(plan.output_tokens for plan in llm_plans)
+    rate_limited = total_tokens / tpm * 60 if tpm else 0
+    generation = output_tokens / output_tps / max(1, concurrency)
+    crawl = plans["crawl"].pending * CRAWL_SECONDS / max(1, concurrency)
+    return max(rate_limited, generation) + crawl
+
+
+def _duration(seconds: float) -> str:
+    hours, rest = divmod(round(seconds), 3600)
+    return f"{hours}h{rest // 60:02d}m" if hours else f"{rest // 60}m{rest % 60:02d}s"
+
+
+def format_plan(plans: Dict[str, StagePlan], concurrency: int, tpm: int | None, output_tps: float) -> str:
+    lines = [f"{'stage':<10}{'cached':>8}{'pending':>9}{'input tokens':>15}{'output tokens':>15}"]
+    for plan in plans.values():
+        note = f"  ({plan.extrapolated} extrapolated)" if plan.extrapolated else ""
+        lines.append(f"{plan.stage:<10}{plan.cached:>8}{plan.pending:>9}{plan.input_tokens:>15,}{plan.output_tokens:>15,}{note}")
+    total = sum(plan.input_tokens + plan.output_tokens for plan in plans.values())
+    limit = f"{tpm:,} TPM" if tpm else "no TPM limit"
+    lines.append(f"{total:,} tokens, about {_duration(estimate_wall_time(plans, concurrency, tpm, output_tps))} "
+                 f"at {concurrency} concurrent videos, {limit} and {output_tps:g} output tokens/s per call")
+    return "\n".join(lines)
+
+
+def print_plan(year: str, locales: List[str], concurrency: int, tpm: int | None = None, output_tps: float = 50,
+               include_podcast: bool = False):
+    ids = video_ids(year)
+    plans = plan_year(year, ids, locales, include_podcast=include_podcast)
+    print(f"WWDC{year}: {len(ids)} sessions, locales {', '.join(locales)}")
+    print(format_plan(plans, concurrency, tpm, output_tps))
@@ -1,10 +1,16 @@
 import os
 import sys
+import json
 import asyncio
+import contextlib
 import urllib
 import datetime
 
-from src.agent.wwdc_translator import graph
+from src.agent.metrics import metrics
+from src.agent.profiling import PROFILE_DIR, LoopMonitor, profile_mode
+from src.agent.wwdc_translator import CacheType, cache_path, get_locales, graph
+from src.agent.wwdc_pipeline import graph as pipeline_graph
+from src.paths import DEFAULT_LOCALE
 
 # https://developer.apple.com/cn/videos/play/wwdc2025/221/
 # get last 2 components of url
@@ -39,7 +45,7 @@ tags:
     foot=""
     return head, foot
 
-def _generate_blog_post(video: map):
+def _generate_blog_post(video: map, locale: str = DEFAULT_LOCALE):
     print(f"generating blog post ({video.get('url', None)})...")
     if video_url := video.get('url', None):
         year, video_id = _parse_video_url(video_url)
@@ -54,50 +60,76 @@ def _generate_blog_post(video: map):
             f.write(head)
             f.write("\n")
 
-            rewrite_path = os.path.join(base_path, '..', '..', f"output/wwdc/{year}/{video_id}_zh_rewrite.md")
-            with open(rewrite_path, "r") as ff:
+            with open(cache_path(year, video_id, CacheType.REWRITED_MARKDOWN, locale), "r") as ff:
                 f.write(ff.read())
             f.write("\n")
             f.write(foot)
 
-async def _translate_wwdc_video(video):
+def _video_config(year: str, video_id: str) -> dict:
+    return {
+        "configurable": {
+            "model": os.environ.get("LLM_MODEL", ""),
+            "base_url": os.environ.get("LLM_BASE_URL", ""),
+            "api_key": os.environ.get("LLM_API_KEY", ""),
+            # JSON list of `ModelRoute` rules, see `Configuration.routes`
+            "routes": json.loads(os.environ.get("LLM_ROUTES", "[]")),
+            "fallback_model": os.environ.get("LLM_FALLBACK_MODEL"),
+            "fallback_base_url": os.environ.get("LLM_FALLBACK_BASE_URL"),
+            "fallback_api_key": os.environ.get("LLM_FALLBACK_API_KEY"),
+            "hedge_requests": os.environ.get("LLM_HEDGE_REQUESTS") == "1",
+            "stage_timeout": float(os.environ["WWDC_STAGE_TIMEOUT"]) if os.environ.get("WWDC_STAGE_TIMEOUT") else None,
+
+            "year": year,
+            "video_id": video_id,
+            "use_cache": True,
+            "locales": os.environ.get("WWDC_LOCALES", "zh").split(","),
+            "write_podcast_script": os.environ.get("WWDC_PODCAST") == "1",
+            "podcast_map_reduce": os.environ.get("WWDC_PODCAST_MAP_REDUCE") == "1",
+        }
+    }
+
+async def _translate_wwdc_video(video, pipeline=False, on_update=None):
     if video_url := video.get('url', None):
         try:
             year, video_id = _parse_video_url(video_url)
             print(f"Translating {year} {video_id}...")
-            async for chunk in graph.astream(
+            config = _video_config(year, video_id)
+            async for chunk in (pipeline_graph if pipeline else graph).astream(
                 input={},
-                config={
-                    "configurable": {
-                        "model": os.environ.get("LLM_MODEL", ""),
-                        "base_url": os.environ.get("LLM_BASE_URL", ""),
-                        "api_key": os.environ.get("LLM_API_KEY", ""),
-
-                        "year": year,
-                        "video_id": video_id,
-                        "use_cache": True
-                    }
-                }
+                config=config,
+                stream_mode=["updates", "custom"]
             ):
                 print(chunk)
-                pass
-            _generate_blog_post(video)
+                if on_update:
+                    on_update(*chunk)
+            # the blog post is written in the first locale, like the podcast script
+            _generate_blog_post(video, get_locales(config)[0])
+            return True
         except Exception as e:
-            print(e, file=sys.stderr)
-            return
+            print(f"{video_url} failed: {e!r}", file=sys.stderr)
+            return False
     
 
-async def translate_wwdc_videos_async(videos: list, max_concurrent=3):
+async def translate_wwdc_videos_async(videos: list, max_concurrent=3, pipeline=False):
     semaphore = asyncio.Semaphore(max_concurrent)
     
     async def limited_task(video):
         async with semaphore:
-            return await _translate_wwdc_video(video)
+            return await _translate_wwdc_video(video, pipeline=pipeline)
 
     tasks = [limited_task(video) for video in videos]
-    results = await asyncio.gather(*tasks)
+    monitor = LoopMonitor() if profile_mode() else None
+    async with monitor or contextlib.nullcontext():
+        results = await asyncio.gather(*tasks)
     print('All results:', results)
+    if failed := [video.get('url') for video, result in zip(videos, results) if result is False]:
+        print(f'{len(failed)} videos failed:', *failed, sep='\n', file=sys.stderr)
+    print('Model latency by route:\n' + metrics.format())
+    if monitor:
+        path = os.path.join(PROFILE_DIR, f'loop_{datetime.datetime.now():%Y%m%d_%H%M%S}.json')
+        monitor.write(path)
+        print(f'Event loop: {monitor.summary()}, saved to {path}')
 
 
-def translate_wwdc_videos(videos: list, max_concurrent=3):
-    asyncio.run(translate_wwdc_videos_async(videos, max_concurrent=max_concurrent))
\ No newline at end of file
+def translate_wwdc_videos(videos: list, max_concurrent=3, pipeline=False):
+    asyncio.run(translate_wwdc_videos_async(videos, max_concurrent=max_concurrent, pipeline=pipeline))
\ No newline at end of file
@@ -0,0 +1,209 @@
+import asyncio
+import json
+import os
+import sys
+import time
+import urllib.parse
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict
+
+import httpx
+import parsel
+
+from src.agent.metrics import RouteMetrics, metrics
+from src.agent.wwdc_translator import OUTPUT_BASE_DIR, write_atomic
+from src.bot.wwdc_translator_bot import _translate_wwdc_video
+from src.tools.scrapy_spider.scrapy_spider.spiders.wwdc_video_links import WWDCVideoLinksSpider, parse_video_links
+
+# a session failing this many times is left alone until the daemon restarts
+MAX_ATTEMPTS = 3
+LAG_SAMPLES = 100
+
+
+class ListingWatcher:
+    """
+    Polls the session listing of a year with conditional requests and queues the sessions
+    that were not translated yet.
+
+    The ETag, Last-Modified date and the translated sessions are kept in `watch_state.json`,
+    so a restarted daemon neither refetches an unchanged listing nor requeues finished sessions.
+    Sessions are fed to the translator graph by `work`, and `lags` records how long after their
+    discovery each session left the queue (`queued`) and finished each graph node.
+    """
+
+    def __init__(self, year: str, client: httpx.AsyncClient, output_dir: str = OUTPUT_BASE_DIR,
+                 translate: Callable[..., Awaitable[bool]] = _translate_wwdc_video):
+        self.year = year
+        self.client = client
+        self.translate = translate
+        self.url = f'{WWDCVideoLinksSpider.base_url}/wwdc{year}'
+        self.state_path = os.path.join(output_dir, year, 'watch_state.json')
+        self.listing_path = os.path.join(output_dir, year, 'videos.jsonl')
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.etag: str | None = None
+        self.last_modified: str | None = None
+        self.videos: list[Dict[str, Any]] = []
+        self.known: set[str] = set()
+        # url -> when it was discovered, for the sessions queued or in progress
+        self.pending: Dict[str, float] = {}
+        self.in_progress: set[str] = set()
+        self.attempts: Counter = Counter()
+        self.lags = RouteMetrics(max_samples=LAG_SAMPLES)
+        self.last_poll: float | None = None
+        self.last_change: float | None = None
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as file:
+                state = json.load(file)
+        except FileNotFoundError:
+            return
+        self.etag = state.get('etag')
+        self.last_modified = state.get('last_modified')
+        self.videos = state.get('videos', [])
+        self.known = set(state.get('known', []))
+
+    async def save(self):
+        await write_atomic(self.state_path, json.dumps({
+            'etag': self.etag,
+            'last_modified': self.last_modified,
+            'videos': self.videos,
+            'known': sorted(self.known),
+        }, ensure_ascii=False, indent=2))
+
+    async def poll(self) -> int:
+        """Fetch the listing unless it is unchanged, queue the new sessions and return how many were queued."""
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        response = await self.client.get(self.url, headers=headers)
+        self.last_poll = time.time()
+        if response.status_code != 304:
+            response.raise_for_status()
+            base_url = str(response.url)
+            videos = parse_video_links(parsel.Selector(text=response.text),
+                                       lambda href: urllib.parse.urljoin(base_url, href))
+            if not videos:
+                print(f"No sessions found on {self.url}, keeping the previous listing.", file=sys.stderr)
+            else:
+                self.videos = videos
+                self.etag = response.headers.get('ETag')
+                self.last_modified = response.headers.get('Last-Modified')
+                self.last_change = self.last_poll
+                # the same listing file `script.py` crawls, which plan mode reads
+                await write_atomic(self.listing_path, json.dumps({'videos': videos}, ensure_ascii=False) + '\n')
+                await self.save()
+        return self.queue_new()
+
+    def queue_new(self) -> int:
+        # also retries sessions that failed before, the listing may be unchanged since
+        new = [video for video in self.videos
+               if (url := video.get('url')) and url not in self.known and url not in self.pending
+               and self.attempts[url] < MAX_ATTEMPTS]
+        for video in new:
+            self.pending[video['url']] = time.time()
+            self.queue.put_nowait(video)
+        return len(new)
+
+    async def work(self, pipeline: bool = False):
+        """Translate queued sessions one at a time, forever."""
+        while True:
+            video = await self.queue.get()
+            url = video['url']
+            discovered = self.pending[url]
+            self.lags.record('queued', time.time() - discovered)
+            self.in_progress.add(url)
+
+            def on_update(mode: str, chunk: Any):
+                if mode == "updates":
+                    for stage in chunk:
+                        self.lags.record(stage, time.time() - discovered)
+
+            try:
+                if await self.translate(video, pipeline=pipeline, on_update=on_update):
+                    self.known.add(url)
+                    await self.save()
+                else:
+                    self.attempts[url] += 1
+            finally:
+                self.in_progress.discard(url)
+                del self.pending[url]
+                self.queue.task_done()
+
+    def status(self, interval: float) -> Dict[str, Any]:
+        return {
+            # healthy while the listing was fetched within the last two intervals, give or take a slow fetch
+            'ok': self.last_poll is not None and time.time() - self.last_poll < 2 * interval + 60,
+            'url': self.url,
+            'last_poll': self.last_poll,
+            'last_change': self.last_change,
+            'sessions': len(self.videos),
+            'translated': len(self.known),
+            'queue_depth': self.queue.qsize(),
+            'in_progress': sorted(self.in_progress),
+            'failed': {url: count for url, count in self.attempts.items() if url not in self.known},
+            # seconds from discovery to leaving the queue and to finishing each graph node
+            'stage_lag': {stage: {'p50': stats['p50'], 'p95': stats['p95'], 'count': stats['calls']}
+                          for stage, stats in self.lags.summary().items()},
+            'models': metrics.summary(),
+        }
+
+
+async def serve_status(watcher: ListingWatcher, interval: float, host: str, port: int) -> asyncio.Server:
+    """A minimal HTTP endpoint answering `GET /status` (or `/health`) with the watcher status as JSON."""
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request = (await asyncio.wait_for(reader.readline(), 5)).decode('latin-1').split()
+            while (await asyncio.wait_for(reader.readline(), 5)).strip():
+                pass
+            path = urllib.parse.urlparse(request[1]).path if len(request) > 1 else ''
+            if path in ('/', '/status', '/health'):
+                status = watcher.status(interval)
+                code = '200 OK' if status['ok'] or path != '/health' else '503 Service Unavailable'
+                body = json.dumps(status, ensure_ascii=False, indent=2).encode('utf-8')
+            else:
+                code, body = '404 Not Found', b'{}'
+            writer.write(f'HTTP/1.1 {code}\r\nContent-Type: application/json\r\n'
+                         f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode('latin-1') + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError, UnicodeDecodeError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
+
+
+async def watch_async(year: str, interval: float = 300, max_concurrent: int = 3, pipeline: bool = False,
+                      host: str = '127.0.0.1', port: int = 8765):
+    """
+    Poll the listing every `interval` seconds and translate new sessions as soon as they appear.
+
+    The process stays up, so the HTTP client, the compiled graph and the chat model clients
+    stay warm between sessions. Each session is still crawled by a `scrapy crawl` subprocess.
+    """
+    async with httpx.AsyncClient(follow_redirects=True, timeout=30) as client:
+        watcher = ListingWatcher(year, client)
+        server = await serve_status(watcher, interval, host, port)
+        workers = [asyncio.create_task(watcher.work(pipeline)) for _ in range(max_concurrent)]
+        print(f"Watching {watcher.url} every {interval:g}s, status on http://{host}:{port}/status")
+        try:
+            while True:
+                try:
+                    if queued := await watcher.poll():
+                        print(f"{queued} sessions queued, {watcher.queue.qsize()} waiting.")
+                except httpx.HTTPError as e:
+                    print(f"Polling {watcher.url} failed: {e!r}", file=sys.stderr)
+                await asyncio.sleep(interval)
+        finally:
+            for worker in workers:
+                worker.cancel()
+            server.close()
+            await server.wait_closed()
+
+
+def watch(year: str, **kwargs):
+    asyncio.run(watch_async(year, **kwargs))
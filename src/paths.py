@@ -0,0 +1,12 @@
+"""
+Where cached artifacts live, shared by the agent, the bots and the index tools.
+
+Kept free of heavy imports, `src.tools` modules load it without pulling in the agent graph.
+"""
+
+import os
+
+OUTPUT_BASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'output', 'wwdc')
+
+# artifacts of this locale are what the bots publish, and index kinds in other locales get a `_<locale>` suffix
+DEFAULT_LOCALE = 'zh'
@@ -6,16 +6,27 @@ class AgentType(Enum):
     WWDC_TRANSLATOR = "wwdc_translator"
     WRITER = "writer"
     PODCAST_SCRIPT_WRITER = "podcast_script_writer"
+    WWDC_SEGMENT_TRANSLATOR = "wwdc_segment_translator"
+    CHAPTER_WRITER = "chapter_writer"
+    CONTINUATION = "continuation"
+    CHAPTER_SUMMARIZER = "chapter_summarizer"
 
 
 async def get_prompt(agent_type: AgentType, **argv) -> str:
     if agent_type == AgentType.WWDC_TRANSLATOR \
         or agent_type == AgentType.WRITER \
-        or agent_type == AgentType.PODCAST_SCRIPT_WRITER:
+        or agent_type == AgentType.PODCAST_SCRIPT_WRITER \
+        or agent_type == AgentType.WWDC_SEGMENT_TRANSLATOR \
+        or agent_type == AgentType.CHAPTER_WRITER \
+        or agent_type == AgentType.CONTINUATION \
+        or agent_type == AgentType.CHAPTER_SUMMARIZER:
         curdir = os.path.dirname(os.path.abspath(__file__))
         prompt_path = os.path.join(curdir, f'{agent_type.value}.md')
         async with aiofiles.open(prompt_path, 'r', encoding='utf-8') as file:
             prompt = await file.read()
+            # fill `{name}` placeholders, leaving any other braces untouched
+            for key, value in argv.items():
+                prompt = prompt.replace(f'{{{key}}}', str(value))
             return prompt
     else:
         return "You a helpful assistant."
\ No newline at end of file
@@ -1,11 +1,12 @@
-
+from .document import MarkdownDocument
 
 class MarkdownBuilder:
     def __init__(self):
         self.markdown_content = ""
+        self.document = MarkdownDocument()
 
-    def add_heading(self, text, level=1):
-        self.add_block(f"{'#' * level} {text}")
+    def add_heading(self, text, level=1, translatable=True):
+        self.add_block(f"{'#' * level} {text}", translatable=translatable)
 
     def build_link(self, text, url):
         return f"[{text}]({url})"
@@ -13,26 +14,33 @@ class MarkdownBuilder:
     def add_paragraph(self, text):
         self.add_block(text)
 
-    def add_list(self, items):
+    def add_list(self, items, translatable=True):
         for item in items:
-            self.add_block(f"- {item}", newline='\n')
+            self.add_block(f"- {item}", newline='\n', translatable=translatable)
 
     def add_code_block(self, code, language=None):
         if language:
-            self.add_block(f'```{language}\n{code}\n```')
+            self.add_block(f'```{language}\n{code}\n```', translatable=False)
         else:
-            self.add_block(f'```\n{code}\n```')
+            self.add_block(f'```\n{code}\n```', translatable=False)
 
-    def add_block(self, block: str, newline='\n\n'):
+    def add_block(self, block: str, newline='\n\n', translatable=True):
         block = block.strip()
         if not block.endswith('\n'):
             block += newline
         if not self.markdown_content.endswith('\n'):
-            self.markdown_content += newline
-        self.markdown_content += block
+            self._append(newline, translatable)
+        self._append(block, translatable)
 
     def add_text(self, text: str):
+        self._append(text)
+
+    def _append(self, text: str, translatable=True):
         self.markdown_content += text
+        self.document.append(text, translatable)
 
     def get_markdown(self):
-        return self.markdown_content.strip()
\ No newline at end of file
+        return self.markdown_content.strip()
+
+    def get_document(self) -> MarkdownDocument:
+        return self.document
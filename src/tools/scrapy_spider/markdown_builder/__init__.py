@@ -1,5 +1,12 @@
-from .wwdc import build_wwdc_markdown
+from .document import MarkdownDocument, Segment
+from .session import WWDCSession, read_jsonl
+from .wwdc import build_wwdc_document, build_wwdc_markdown
 
 __ALL__ = [
-    build_wwdc_markdown
-]
\ No newline at end of file
+    build_wwdc_document,
+    build_wwdc_markdown,
+    MarkdownDocument,
+    Segment,
+    WWDCSession,
+    read_jsonl,
+]
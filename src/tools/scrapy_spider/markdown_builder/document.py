@@ -0,0 +1,148 @@
+import re
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List
+
+PLACEHOLDER_RE = re.compile(r'<!--\s*passthrough:(\d+)\s*-->')
+
+# Sections appended by `build_wwdc_markdown` that are plain link lists.
+PASSTHROUGH_SECTIONS = ('Related Videos', 'Documents', '相关视频', '文档')
+
+# a code fence line, `re.M` so it also finds fences within a whole document
+FENCE_RE = re.compile(r'^\s*```', re.M)
+_CHAPTER_RE = re.compile(r'^## ', re.M)
+
+
+def placeholder(index: int) -> str:
+    return f'<!-- passthrough:{index} -->'
+
+
+@dataclass
+class Segment:
+    text: str
+    translatable: bool = True
+
+
+@dataclass
+class MarkdownDocument:
+    """
+    Markdown split into translatable text and passthrough segments (code blocks, link lists).
+
+    Only translatable text needs to go through the LLM. Passthrough segments are replaced
+    with placeholders (or dropped when they trail the document) and spliced back afterwards.
+    """
+    segments: List[Segment] = field(default_factory=list)
+
+    def to_markdown(self) -> str:
+        return ''.join(segment.text for segment in self.segments).strip()
+
+    def passthrough(self) -> List[str]:
+        return [segment.text.strip() for segment in self.segments if not segment.translatable]
+
+    def _trailing_start(self) -> int:
+        """
+        Index (within `passthrough()`) of the first passthrough segment that is only followed by passthrough segments.
+        """
+        count = len(self.passthrough())
+        for segment in reversed(self.segments):
+            if segment.translatable:
+                if segment.text.strip():
+                    break
+            else:
+                count -= 1
+        return count
+
+    def prompt_text(self, markdown: str | None = None, placeholders: bool = True) -> str:
+        """
+        Returns `markdown` (the document itself by default, or a rendering of it such as its
+        translation) with passthrough segments swapped for placeholders.
+
+        Trailing passthrough segments are dropped entirely, as are all of them when
+        `placeholders` is False.
+        """
+        text = self.to_markdown() if markdown is None else markdown
+        trailing_start = self._trailing_start()
+        position = 0
+        for index, passthrough in enumerate(self.passthrough()):
+            found = text.find(passthrough, position)
+            if found < 0:
+                continue
+            replacement = placeholder(index) if placeholders and index < trailing_start else ''
+            text = text[:found] + replacement + text[found + len(passthrough):]
+            position = found + len(replacement)
+        return re.sub(r'\n{3,}', '\n\n', text).strip()
+
+    def splice(self, text: str) -> str:
+        """
+        Restores passthrough segments into LLM output produced from `prompt_text`.
+
+        Placeholders the model dropped are appended after the text, before the trailing segments.
+        """
+        passthrough = self.passthrough()
+        restored = set()
+
+        def restore(match: re.Match) -> str:
+            index = int(match.group(1))
+            if index >= len(passthrough):
+                return ''
+            restored.add(index)
+            return passthrough[index]
+
+        text = PLACEHOLDER_RE.sub(restore, text).strip()
+        missing = [passthrough[index] for index in range(len(passthrough)) if index not in restored]
+        return '\n\n'.join([text, *missing]).strip()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'MarkdownDocument':
+        return cls([Segment(**segment) for segment in data.get('segments', [])])
+
+    @classmethod
+    def from_markdown(cls, markdown: str) -> 'MarkdownDocument':
+        """
+        Recovers the segments of markdown produced by `build_wwdc_markdown`: fenced code
+        blocks and the link list sections at the end of the document are passthrough.
+        """
+        document = cls()
+        lines = markdown.split('\n')
+        in_fence = False
+        trailing = False
+        for line in lines:
+            stripped = line.strip()
+            if not trailing and not in_fence and stripped.startswith('# ') \
+                    and stripped[2:].strip() in PASSTHROUGH_SECTIONS:
+                trailing = True
+            translatable = not (trailing or in_fence or FENCE_RE.match(line))
+            if FENCE_RE.match(line):
+                in_fence = not in_fence
+            document.append(line + '\n', translatable)
+        return document
+
+    def split_chapters(self) -> List['MarkdownDocument']:
+        """
+        Splits the document before every chapter (`## `) heading.
+
+        The first chunk holds everything before the first chapter, and the trailing link
+        lists stay with the last chapter.
+        """
+        chunks = [MarkdownDocument()]
+        for segment in self.segments:
+            if not segment.translatable:
+                chunks[-1].append(segment.text, False)
+                continue
+            position = 0
+            for match in _CHAPTER_RE.finditer(segment.text):
+                chunks[-1].append(segment.text[position:match.start()])
+                chunks.append(MarkdownDocument())
+                position = match.start()
+            chunks[-1].append(segment.text[position:])
+        return [chunk for chunk in chunks if chunk.to_markdown()]
+
+    def append(self, text: str, translatable: bool = True):
+        if not text:
+            return
+        if self.segments and self.segments[-1].translatable == translatable:
+            self.segments[-1].text += text
+        else:
+            self.segments.append(Segment(text, translatable))
@@ -0,0 +1,171 @@
+from array import array
+from math import inf
+from typing import Any, Dict, Iterator, List, Tuple
+
+import orjson
+
+SESSION_FORMAT_VERSION = 1
+
+
+def parse_time(value: Any, default: float = 0) -> float:
+    """
+    Parses a crawled timestamp, returning a default value if parsing fails.
+    """
+    if value is None:
+        return default
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+class Chapter:
+    __slots__ = ('index', 'title', 'start_time', 'end_time')
+
+    def __init__(self, index: int | None, title: str, start_time: float, end_time: float = inf):
+        self.index = index
+        self.title = title
+        self.start_time = start_time
+        self.end_time = end_time
+
+    def contains(self, time: float) -> bool:
+        return self.start_time <= time <= self.end_time
+
+
+class SampleCode:
+    __slots__ = ('start_time', 'description', 'code', 'language')
+
+    def __init__(self, start_time: float, description: str | None, code: str | None, language: str | None = None):
+        self.start_time = start_time
+        self.description = description
+        self.code = code
+        self.language = language
+
+
+class Link:
+    __slots__ = ('title', 'url')
+
+    def __init__(self, title: str, url: str):
+        self.title = title
+        self.url = url
+
+
+class Transcript:
+    """
+    Transcript sentences stored as columns: an `array('d')` of start times and a list of texts.
+    """
+    __slots__ = ('start_times', 'texts')
+
+    def __init__(self, start_times: array | None = None, texts: List[str] | None = None):
+        self.start_times = start_times if start_times is not None else array('d')
+        self.texts = texts if texts is not None else []
+
+    def append(self, start_time: float, text: str):
+        self.start_times.append(start_time)
+        self.texts.append(text)
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def __iter__(self) -> Iterator[Tuple[float, str]]:
+        return zip(self.start_times, self.texts)
+
+
+class WWDCSession:
+    """
+    Compact in-memory form of one crawled WWDC session.
+
+    Timestamps are parsed once when the session is loaded, and `to_bytes` / `from_bytes`
+    store it in a columnar orjson layout that loads much faster than the crawled JSONL.
+    """
+    __slots__ = ('title', 'description', 'chapters', 'transcript', 'sample_codes', 'related_videos', 'documents')
+
+    def __init__(self, title: str = '', description: str = '',
+                 chapters: List[Chapter] | None = None,
+                 transcript: Transcript | None = None,
+                 sample_codes: List[SampleCode] | None = None,
+                 related_videos: List[Link] | None = None,
+                 documents: List[Link] | None = None):
+        self.title = title
+        self.description = description
+        self.chapters = chapters or []
+        self.transcript = transcript or Transcript()
+        self.sample_codes = sample_codes or []
+        self.related_videos = related_videos or []
+        self.documents = documents or []
+
+    @property
+    def has_detail(self) -> bool:
+        return bool(self.title or self.description or self.chapters)
+
+    def chapter_at(self, time: float) -> Chapter | None:
+        for chapter in self.chapters:
+            if chapter.contains(time):
+                return chapter
+        return None
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'WWDCSession':
+        """
+        Builds a session from a crawled item, accepting both string and numeric timestamps.
+        """
+        detail = data.get('detail') or {}
+        transcript = Transcript()
+        for sentence in data.get('transcript') or []:
+            transcript.append(parse_time(sentence.get('start_time')), sentence.get('text') or '')
+        return cls(
+            title=detail.get('title') or '',
+            description=detail.get('description') or '',
+            chapters=[Chapter(
+                index=int(parse_time(chapter['index'])) if chapter.get('index') is not None else None,
+                title=chapter.get('title') or '',
+                start_time=parse_time(chapter.get('start_time')),
+                end_time=parse_time(chapter.get('end_time'), inf),
+            ) for chapter in detail.get('chapters') or []],
+            transcript=transcript,
+            sample_codes=[SampleCode(
+                start_time=parse_time(code.get('start_time')),
+                description=code.get('description'),
+                code=code.get('code'),
+                language=code.get('language'),
+            ) for code in data.get('sample_codes') or []],
+            related_videos=[Link(video.get('title') or '', video.get('url') or '') for video in data.get('related_videos') or []],
+            documents=[Link(document.get('title') or '', document.get('url') or '') for document in data.get('documents') or []],
+        )
+
+    def to_bytes(self) -> bytes:
+        return orjson.dumps({
+            'version': SESSION_FORMAT_VERSION,
+            'title': self.title,
+            'description': self.description,
+            'chapters': [[chapter.index, chapter.title, chapter.start_time,
+                          None if chapter.end_time == inf else chapter.end_time] for chapter in self.chapters],
+            'start_times': self.transcript.start_times.tolist(),
+            'texts': self.transcript.texts,
+            'sample_codes': [[code.start_time, code.description, code.code, code.language] for code in self.sample_codes],
+            'related_videos': [[link.title, link.url] for link in self.related_videos],
+            'documents': [[link.title, link.url] for link in self.documents],
+        })
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'WWDCSession':
+        raw = orjson.loads(data)
+        if raw.get('version') != SESSION_FORMAT_VERSION:
+            raise ValueError(f"Unsupported session format version: {raw.get('version')}")
+        return cls(
+            title=raw['title'],
+            description=raw['description'],
+            chapters=[Chapter(index, title, start, inf if end is None else end) for index, title, start, end in raw['chapters']],
+            transcript=Transcript(array('d', raw['start_times']), raw['texts']),
+            sample_codes=[SampleCode(*code) for code in raw['sample_codes']],
+            related_videos=[Link(*link) for link in raw['related_videos']],
+            documents=[Link(*link) for link in raw['documents']],
+        )
+
+
+def read_jsonl(path: str) -> List[Dict[str, Any]]:
+    """
+    Reads every non-empty line of a scrapy JSONL feed.
+    """
+    with open(path, 'rb') as file:
+        return [orjson.loads(line) for line in file if line.strip()]
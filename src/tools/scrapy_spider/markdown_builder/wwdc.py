@@ -1,19 +1,21 @@
 from typing import Any, Dict, List, Union
 from math import inf
 from .MarkdownBuilder import MarkdownBuilder
+from .document import MarkdownDocument
+from .session import SampleCode, WWDCSession
 
-def _parse_float(value: str, default: float = 0) -> float:
+def build_wwdc_markdown(input: Union[WWDCSession, Dict[str, Any]]) -> str:
     """
-    Parses a string to an integer, returning a default value if parsing fails.
+    Builds a markdown string from the given input data.
     """
-    try:
-        return float(value)
-    except:
-        return default
+    return build_wwdc_document(input).to_markdown()
 
-def build_wwdc_markdown(input: Dict[str, Any]):
+def build_wwdc_document(input: Union[WWDCSession, Dict[str, Any]]) -> MarkdownDocument:
     """
-    Builds a markdown string from the given input data.
+    Builds a markdown document from a crawled session (or its raw crawled dict).
+
+    Code blocks and the related videos / documents link lists are marked as passthrough,
+    everything else is translatable.
     
     ```markdown
     # {title}
@@ -26,73 +28,56 @@ def build_wwdc_markdown(input: Dict[str, Any]):
     {documents}
     ```
     """
+    session = input if isinstance(input, WWDCSession) else WWDCSession.from_dict(input)
 
     mdbuilder = MarkdownBuilder()
 
     # title and description
-    if detail := input.get("detail"):
-        title = detail.get('title', '')
-        description = detail.get('description', '')
-        mdbuilder.add_heading(title)
-        mdbuilder.add_paragraph(description)
+    if session.has_detail:
+        mdbuilder.add_heading(session.title)
+        mdbuilder.add_paragraph(session.description)
 
     # transcript and code
-    if transcript := input["transcript"]:
+    if session.transcript:
         mdbuilder.add_heading('Transcript')
-        codes = input.get("sample_codes", [])
-        def find_code_in_range(start_time: float, end_time: float) -> map|None:
+        codes = session.sample_codes
+        def find_code_in_range(start_time: float, end_time: float) -> SampleCode|None:
             for code in codes:
-                time = _parse_float(code['start_time'])
-                if time >= start_time and time < end_time:
+                if code.start_time >= start_time and code.start_time < end_time:
                     return code
             return None
-        
-        def chapter_in(time: float) -> map|None:
-            for chapter in input.get("detail", {}).get("chapters", []):
-                chapter_start = _parse_float(chapter['start_time'])
-                chapter_end = _parse_float(chapter.get('end_time', inf))
-                if time >= chapter_start and time <= chapter_end:
-                    # The time range is within the chapter
-                    return chapter
-            return None
-        
+
         prev_time = 0
         chapter_index = -1
-        for sentence in transcript:
-            time = _parse_float(sentence['start_time'])
-            if chapter := chapter_in(time):
-                if index := chapter.get('index', None):
-                    if index != chapter_index:
-                        chapter_index = index
-                        mdbuilder.add_heading(chapter.get('title', ''), level=2)
+        for time, text in session.transcript:
+            if chapter := session.chapter_at(time):
+                if chapter.index is not None and chapter.index != chapter_index:
+                    chapter_index = chapter.index
+                    mdbuilder.add_heading(chapter.title, level=2)
             if code := find_code_in_range(prev_time, time):
-                if description := code.get('description', None):
-                    mdbuilder.add_block(f'> {description}')
-                if codeblock := code.get('code', None):
-                    mdbuilder.add_code_block(codeblock, language=code.get('language', None))
-            mdbuilder.add_text(sentence.get('text', ''))
+                if code.description:
+                    mdbuilder.add_block(f'> {code.description}')
+                if code.code:
+                    mdbuilder.add_code_block(code.code, language=code.language)
+            mdbuilder.add_text(text)
             prev_time = time
 
         if code := find_code_in_range(prev_time, inf):
-            mdbuilder.add_code_block(code.get('code', None), language=code.get('language', None))
+            mdbuilder.add_code_block(code.code, language=code.language)
 
     # related videos
-    if related_videos := input.get("related_videos", []):
-        mdbuilder.add_heading('Related Videos')
+    if related_videos := session.related_videos:
+        mdbuilder.add_heading('Related Videos', translatable=False)
         for video in related_videos:
-            title = video.get('title', '')
-            url = video.get('url', '')
-            mdbuilder.add_block(mdbuilder.build_link(title, url), newline='\n')
+            mdbuilder.add_block(mdbuilder.build_link(video.title, video.url), newline='\n', translatable=False)
 
     # documents
-    if documents := input.get("documents", []):
-        mdbuilder.add_heading('Documents')
+    if documents := session.documents:
+        mdbuilder.add_heading('Documents', translatable=False)
         for document in documents:
-            title = document.get('title', '')
-            url = document.get('url', '')
-            mdbuilder.add_block(mdbuilder.build_link(title, url), newline='\n')
+            mdbuilder.add_block(mdbuilder.build_link(document.title, document.url), newline='\n', translatable=False)
 
-    return mdbuilder.get_markdown()
+    return mdbuilder.get_document()
 
 
 if __name__ == '__main__':
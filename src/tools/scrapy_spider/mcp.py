@@ -2,10 +2,11 @@ from mcp.server.fastmcp import FastMCP
 from typing import Annotated
 from pydantic import Field
 from .wwdc_task import WWDCTask
+from ..search_index import SearchIndex
 
 mcp = FastMCP("scrapy_spider")
 
-@mcp.tool
+@mcp.tool()
 def fetch_wwdc_video_detail(
     video_id: Annotated[str, Field(description="The ID of the WWDC video")],
     year: Annotated[str, Field(description="The year of the WWDC video")] = "2025",
@@ -16,7 +17,26 @@ def fetch_wwdc_video_detail(
     return task.run()
 
 
-@mcp.tool
+@mcp.tool()
+def search_wwdc_sessions(
+    query: Annotated[str, Field(description="Words to search for, such as an API name or a topic")],
+    year: Annotated[str | None, Field(description="Only search sessions of this WWDC year")] = None,
+    kind: Annotated[str | None, Field(description="Only search one artifact kind: original_markdown, translated_markdown or rewrited_markdown; translations other than Chinese end with `_<locale>`, e.g. translated_markdown_ja")] = None,
+    limit: Annotated[int, Field(description="Maximum number of chapters to return")] = 10,
+    ) -> str:
+    """Searches crawled, translated and rewritten WWDC sessions chapter by chapter."""
+
+    results = SearchIndex().search(query, limit=limit, year=year, kind=kind)
+    if not results:
+        return f"No sessions found for: {query}"
+    return "\n\n".join(
+        f"- WWDC{result['year']} {result['video_id']} / {result['title'] or 'Untitled'} ({result['kind']})\n"
+        f"  {result['url']}\n"
+        f"  {result['snippet']}"
+        for result in results)
+
+
+@mcp.tool()
 def fetch_apple_document(
     document_urls: Annotated[list[str], Field(description="List of Apple document URLs")],
     ):
@@ -1,6 +1,13 @@
 import scrapy
 import json
 
+def _parse_time(value: str | None) -> float | None:
+    """Timestamps are parsed once here, so the feed already carries numbers."""
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
 class WWDCSpider(scrapy.Spider):
     name = 'wwdc'
     base_url = 'https://developer.apple.com/videos/play'
@@ -28,9 +35,9 @@ class WWDCSpider(scrapy.Spider):
             title = detail_info.css('h1::text').get()
             description = detail_info.css('p::text').get()
             chapters = [{
-                'start_time': chapter_item.css('::attr(data-start-time)').get(),
-                'end_time': chapter_item.css('::attr(data-chapter-end-time)').get(),
-                'length': chapter_item.css('::attr(data-chapter-lenght)').get(),
+                'start_time': _parse_time(chapter_item.css('::attr(data-start-time)').get()),
+                'end_time': _parse_time(chapter_item.css('::attr(data-chapter-end-time)').get()),
+                'length': _parse_time(chapter_item.css('::attr(data-chapter-lenght)').get()),
                 'index': chapter_item.css('::attr(data-chapter-index)').get(),
                 'title': chapter_item.css('a::text').get(),
             } for chapter_item in detail_info.css(".chapter-list").css(".chapter-item")]
@@ -59,8 +66,8 @@ class WWDCSpider(scrapy.Spider):
         transcript = response.css('.transcript')
         if transcript:
             transcript_items = [{
-                'start_time': transcript_item.css('::attr(data-start)').get()
-                    or transcript_item.css('::attr(data-start-time)').get(),
+                'start_time': _parse_time(transcript_item.css('::attr(data-start)').get()
+                    or transcript_item.css('::attr(data-start-time)').get()),
                 # 'end_time': transcript_item.css('::attr(data-end-time)').get(),
                 'text': transcript_item.css('::text').get()
             } for transcript_item in transcript.css(".sentence")]
@@ -69,7 +76,7 @@ class WWDCSpider(scrapy.Spider):
         sample_codes = response.css('.sample-code')
         if sample_codes:
             sample_codes_items = [{
-                'start_time': sample_code.css('::attr(data-start-time)').get(),
+                'start_time': _parse_time(sample_code.css('::attr(data-start-time)').get()),
                 'description': sample_code.css('a::text').get(),
                 'code': ''.join(sample_code.css('code ::text').getall())
             } for sample_code in sample_codes.css(".sample-code-main-container")]
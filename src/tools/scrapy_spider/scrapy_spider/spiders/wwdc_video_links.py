@@ -1,4 +1,4 @@
-from typing import override
+from typing import Callable, override
 import scrapy
 import json
 
@@ -14,19 +14,24 @@ class WWDCVideoLinksSpider(scrapy.Spider):
 
 
     def parse(self, response):
-        list = response.css(".main-content .vc-collection a")
-        data = [
-            {
-                'title': item.css('.vc-card__title::text').get(),
-                'title-en': item.css('.vc-card__title::attr(data-filter-title-en)').get(),
-                'description': item.css('.vc-card__keywords::attr(data-filter-description)').get(),
-                'description-en': item.css('.vc-card__keywords::attr(data-filter-description-en)').get(),
-                'platform': item.css('.vc-card__keywords::attr(data-filter-platform)').get(),
-                'url': response.urljoin(item.css('::attr(href)').get()),
-                'category': item.css('::attr(data-category)').get(),
-                'image': item.css('img::attr(src)').get(),
-                'duration': item.css('.vc-card__duration::text').get(),
-            }
-            for item in list
-        ]
-        yield {'videos': data}
\ No newline at end of file
+        yield {'videos': parse_video_links(response, response.urljoin)}
+
+
+def parse_video_links(selector, urljoin: Callable[[str], str]) -> list[dict]:
+    """
+    The session cards of a listing page, from a scrapy response or a `parsel.Selector` of the page.
+    """
+    return [
+        {
+            'title': item.css('.vc-card__title::text').get(),
+            'title-en': item.css('.vc-card__title::attr(data-filter-title-en)').get(),
+            'description': item.css('.vc-card__keywords::attr(data-filter-description)').get(),
+            'description-en': item.css('.vc-card__keywords::attr(data-filter-description-en)').get(),
+            'platform': item.css('.vc-card__keywords::attr(data-filter-platform)').get(),
+            'url': urljoin(item.css('::attr(href)').get()),
+            'category': item.css('::attr(data-category)').get(),
+            'image': item.css('img::attr(src)').get(),
+            'duration': item.css('.vc-card__duration::text').get(),
+        }
+        for item in selector.css(".main-content .vc-collection a")
+    ]
@@ -1,14 +1,11 @@
 from os import path, remove
 import subprocess
-import json
-from scrapy.crawler import CrawlerProcess
-from scrapy.utils.project import get_project_settings
+# scrapy is only needed by the in-process crawler below, the spider itself runs in a
+# `scrapy crawl` subprocess, so importing this module stays cheap for cache hits.
 if __name__ == "__main__":
-    from scrapy_spider.spiders.wwdc import WWDCSpider
-    from markdown_builder import build_wwdc_markdown
+    from markdown_builder import build_wwdc_document, MarkdownDocument, WWDCSession, read_jsonl
 else:
-    from .scrapy_spider.spiders.wwdc import WWDCSpider
-    from .markdown_builder import build_wwdc_markdown
+    from .markdown_builder import build_wwdc_document, MarkdownDocument, WWDCSession, read_jsonl
 
 class WWDCTask:
     CURRENT_DIR = path.dirname(path.abspath(__file__))
@@ -23,21 +20,21 @@ class WWDCTask:
     def crawl_file_path(self) -> str:
         return path.join(self.OUTPUT_BASE_DIR, self.year, f"{self.video_id}_{self.locale}.jsonl")
     
+    @property
+    def session_file_path(self) -> str:
+        return path.join(self.OUTPUT_BASE_DIR, self.year, f"{self.video_id}_{self.locale}.session.json")
+
     @property
     def markdown_file_path(self) -> str:
         return path.join(self.OUTPUT_BASE_DIR, self.year, f"{self.video_id}_{self.locale}.md")
     
     def remove_caches(self):
-        if path.exists(self.crawl_file_path):
-            try:
-                remove(self.crawl_file_path)
-            except Exception as e:
-                print(f"Error removing file {self.crawl_file_path}: {e}")
-        if path.exists(self.markdown_file_path):
-            try:
-                remove(self.markdown_file_path)
-            except Exception as e:
-                print(f"Error removing file {self.markdown_file_path}: {e}")
+        for file_path in (self.crawl_file_path, self.session_file_path, self.markdown_file_path):
+            if path.exists(file_path):
+                try:
+                    remove(file_path)
+                except Exception as e:
+                    print(f"Error removing file {file_path}: {e}")
 
     def crawl(self):
         command = [
@@ -57,6 +54,12 @@ class WWDCTask:
         if res.returncode != 0:
             raise res.stderr
         return
+        from scrapy.crawler import CrawlerProcess
+        from scrapy.utils.project import get_project_settings
+        if __name__ == "__main__":
+            from scrapy_spider.spiders.wwdc import WWDCSpider
+        else:
+            from .scrapy_spider.spiders.wwdc import WWDCSpider
         settings = get_project_settings()
         settings.set('LOG_LEVEL', 'WARNING')
         settings.set('FEEDS', {
@@ -74,39 +77,60 @@ class WWDCTask:
         process.crawl(WWDCSpider, wwdc=self.year, vid=self.video_id)
         process.start()
 
-    def _read_crawled_data(self) -> dict|None:
-        with open(self.crawl_file_path, 'r', encoding='utf-8') as file:
-            data = file.read().strip()
-            if data:
-                try:
-                    return json.loads(data)
-                except:
-                    return None
+    def _read_crawled_data(self) -> WWDCSession|None:
+        try:
+            if items := read_jsonl(self.crawl_file_path):
+                return WWDCSession.from_dict(items[0])
+        except (OSError, ValueError):
+            pass
         return None
 
+    def read_session(self) -> WWDCSession|None:
+        """Load the compact session written after the last crawl, if any."""
+        try:
+            with open(self.session_file_path, 'rb') as file:
+                return WWDCSession.from_bytes(file.read())
+        except (OSError, ValueError):
+            return None
+
+    def _write_session(self, session: WWDCSession):
+        with open(self.session_file_path, 'wb') as file:
+            file.write(session.to_bytes())
+
     def _write_markdown(self, markdown: str):
         with open(self.markdown_file_path, 'w', encoding='utf-8') as file:
             file.write(markdown)
 
+    def generate_document(self) -> MarkdownDocument|None:
+        if session := self._read_crawled_data():
+            self._write_session(session)
+            document = build_wwdc_document(session)
+            self._write_markdown(document.to_markdown())
+            return document
+        return None
+
     def generate_markdown(self) -> str|None:
-        if data := self._read_crawled_data():
-            markdown = build_wwdc_markdown(data)
-            self._write_markdown(markdown)
-            return markdown
+        if document := self.generate_document():
+            return document.to_markdown()
         return None
-    
-    def run(self) -> str | None:
+
+    def run_document(self) -> MarkdownDocument | None:
         print(f"Starting WWDC task for year {self.year} and video ID {self.video_id}...")
         self.remove_caches()
         self.crawl()
-        markdown = self.generate_markdown()
-        if not markdown:
+        document = self.generate_document()
+        if not document:
             self.locale = 'en'
             self.remove_caches()
             self.crawl()
-            markdown = self.generate_markdown()
+            document = self.generate_document()
         print(f"Markdown generated at {self.markdown_file_path}")
-        return markdown
+        return document
+
+    def run(self) -> str | None:
+        if document := self.run_document():
+            return document.to_markdown()
+        return None
 
 
 if __name__ == "__main__":
@@ -0,0 +1,222 @@
+import hashlib
+import os
+import re
+import sqlite3
+from contextlib import contextmanager
+from typing import Any, Dict, List
+
+from src.paths import DEFAULT_LOCALE, OUTPUT_BASE_DIR
+from src.tools.scrapy_spider.markdown_builder.document import FENCE_RE
+
+DEFAULT_INDEX_PATH = os.path.join(OUTPUT_BASE_DIR, 'search_index.sqlite3')
+
+# cached markdown artifacts: `<video_id>.md`, `<video_id>_<locale>.md` and `<video_id>_<locale>_rewrite.md`
+# (see `CacheType.file_postfix`)
+_ARTIFACT_RE = re.compile(r'^(?P<video_id>[^_.]+)(?:_(?P<locale>[A-Za-z-]+?)(?P<rewrite>_rewrite)?)?\.md$')
+
+_CHAPTER_RE = re.compile(r'^## ', re.M)
+
+
+def video_url(year: str, video_id: str, start_time: float | None = None) -> str:
+    url = f'https://developer.apple.com/videos/play/wwdc{year}/{video_id}/'
+    if start_time:
+        url += f'?time={int(start_time)}'
+    return url
+
+
+def artifact_kind(kind: str, locale: str = DEFAULT_LOCALE) -> str:
+    """
+    Index kind of a cached artifact. Translations into locales other than the default one get a `_<locale>` suffix.
+    """
+    if kind == 'original_markdown' or locale == DEFAULT_LOCALE:
+        return kind
+    return f'{kind}_{locale}'
+
+
+def split_chapters(markdown: str) -> List[tuple[str, str]]:
+    """
+    Splits markdown into `(heading, body)` chunks before every `## ` heading outside code fences.
+
+    The first chunk holds everything before the first chapter and is titled by the `# ` heading.
+    """
+    chunks: List[List[str]] = [[]]
+    in_fence = False
+    for line in markdown.split('\n'):
+        if FENCE_RE.match(line):
+            in_fence = not in_fence
+        elif not in_fence and _CHAPTER_RE.match(line):
+            chunks.append([])
+        chunks[-1].append(line)
+    result = []
+    for lines in chunks:
+        heading = next((line.lstrip('#').strip() for line in lines if line.startswith('#')), '')
+        if body := '\n'.join(lines).strip():
+            result.append((heading, body))
+    return result
+
+
+def _highlight(body: str, terms: List[str], width: int = 32) -> str:
+    """
+    Builds a snippet around the first term for matches found without the FTS index.
+    """
+    position = body.find(terms[0]) if terms else 0
+    start, end = max(0, position - width), position + width
+    text = body[start:end]
+    for term in terms:
+        text = text.replace(term, f'**{term}**')
+    return ('…' if start else '') + text + ('…' if end < len(body) else '')
+
+
+def _fts_query(query: str) -> str:
+    return ' '.join('"' + term.replace('"', '""') + '"' for term in query.split())
+
+
+class SearchIndex:
+    """
+    SQLite FTS5 index over crawled, translated and rewritten sessions, one row per chapter.
+
+    Uses the trigram tokenizer so Chinese text and partial API names match as substrings.
+    Artifacts are re-indexed only when their content changes.
+    """
+
+    def __init__(self, path: str = DEFAULT_INDEX_PATH):
+        self.path = path
+        if dirname := os.path.dirname(path):
+            os.makedirs(dirname, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE VIRTUAL TABLE IF NOT EXISTS chapters USING fts5('
+                'title, body, year UNINDEXED, video_id UNINDEXED, kind UNINDEXED, '
+                'chapter UNINDEXED, start_time UNINDEXED, tokenize = "trigram")')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS artifacts ('
+                'year TEXT NOT NULL, video_id TEXT NOT NULL, kind TEXT NOT NULL, sha1 TEXT NOT NULL, '
+                'PRIMARY KEY (year, video_id, kind))')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS chapter_times ('
+                'year TEXT NOT NULL, video_id TEXT NOT NULL, position INTEGER NOT NULL, '
+                'title TEXT NOT NULL, start_time REAL NOT NULL, '
+                'PRIMARY KEY (year, video_id, position))')
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def record_chapter_times(self, year: str, video_id: str, chapters: List[tuple[str, float]]):
+        """
+        Stores the `(title, start_time)` of each chapter of a session, used for timestamped deep links.
+        """
+        with self._connect() as conn:
+            conn.execute('DELETE FROM chapter_times WHERE year = ? AND video_id = ?', (year, video_id))
+            conn.executemany(
+                'INSERT INTO chapter_times (year, video_id, position, title, start_time) VALUES (?, ?, ?, ?, ?)',
+                [(year, video_id, position, title, start_time) for position, (title, start_time) in enumerate(chapters)])
+
+    def index_artifact(self, year: str, video_id: str, kind: str, content: str) -> bool:
+        """
+        (Re-)indexes one artifact chapter by chapter. Returns False when it was already up to date.
+        """
+        sha1 = hashlib.sha1(content.encode('utf-8')).hexdigest()
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT sha1 FROM artifacts WHERE year = ? AND video_id = ? AND kind = ?',
+                (year, video_id, kind)).fetchone()
+            if row and row[0] == sha1:
+                return False
+
+            times = conn.execute(
+                'SELECT title, start_time FROM chapter_times WHERE year = ? AND video_id = ? ORDER BY position',
+                (year, video_id)).fetchall()
+            by_title = dict(times)
+
+            rows = []
+            for chapter, (title, body) in enumerate(split_chapters(content)):
+                # chunk 0 is the title and description, chunk n is the n-th chapter
+                start_time = by_title.get(title)
+                if start_time is None and 0 < chapter <= len(times):
+                    start_time = times[chapter - 1][1]
+                rows.append((title, body, year, video_id, kind, chapter, start_time))
+
+            conn.execute(
+                'DELETE FROM chapters WHERE year = ? AND video_id = ? AND kind = ?', (year, video_id, kind))
+            conn.executemany(
+                'INSERT INTO chapters (title, body, year, video_id, kind, chapter, start_time) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+            conn.execute(
+                'INSERT INTO artifacts (year, video_id, kind, sha1) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (year, video_id, kind) DO UPDATE SET sha1 = excluded.sha1',
+                (year, video_id, kind, sha1))
+        return True
+
+    def search(self, query: str, limit: int = 10, year: str | None = None, kind: str | None = None) -> List[Dict[str, Any]]:
+        """
+        Returns the best matching chapters with a highlighted snippet and a deep link to the video time.
+        """
+        filters, params = [], []
+        if year:
+            filters.append('year = ?')
+            params.append(year)
+        if kind:
+            filters.append('kind = ?')
+            params.append(kind)
+
+        terms = query.split()
+        if terms and all(len(term) >= 3 for term in terms):
+            match = 'chapters MATCH ?'
+            params.insert(0, _fts_query(query))
+            order = 'bm25(chapters)'
+            snippet = "snippet(chapters, 1, '**', '**', '…', 64)"
+        else:
+            # the trigram tokenizer cannot match terms shorter than three characters, scan instead
+            match = ' AND '.join('instr(body, ?) > 0' for _ in terms) or '1'
+            params[:0] = terms
+            order = 'rowid'
+            snippet = 'body'
+        where = ' AND '.join([match, *filters])
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT year, video_id, kind, chapter, title, start_time, {snippet} "
+                f"FROM chapters WHERE {where} ORDER BY {order} LIMIT ?",
+                [*params, limit]).fetchall()
+        return [{
+            'year': year,
+            'video_id': video_id,
+            'kind': kind,
+            'chapter': chapter,
+            'title': title,
+            'start_time': start_time,
+            'snippet': text if snippet != 'body' else _highlight(text, terms),
+            'url': video_url(year, video_id, start_time),
+        } for year, video_id, kind, chapter, title, start_time, text in rows]
+
+    def index_directory(self, output_dir: str = OUTPUT_BASE_DIR) -> int:
+        """
+        Indexes every cached artifact under `output_dir/<year>/`. Returns the number of updated artifacts.
+        """
+        updated = 0
+        for year in sorted(os.listdir(output_dir)):
+            year_dir = os.path.join(output_dir, year)
+            # caches and indexes next to the years (e.g. `.chapter_summaries`) are not sessions
+            if not year.isdigit() or not os.path.isdir(year_dir):
+                continue
+            for entry in os.scandir(year_dir):
+                if not (match := _ARTIFACT_RE.match(entry.name)):
+                    continue
+                if not match['locale']:
+                    kind = 'original_markdown'
+                else:
+                    kind = artifact_kind('rewrited_markdown' if match['rewrite'] else 'translated_markdown', match['locale'])
+                with open(entry.path, 'r', encoding='utf-8') as file:
+                    updated += self.index_artifact(year, match['video_id'], kind, file.read())
+        return updated
+
+
+if __name__ == '__main__':
+    index = SearchIndex()
+    print(f'{index.index_directory()} artifacts indexed into {index.path}')
@@ -0,0 +1,220 @@
+import json
+import os
+import re
+import threading
+import zlib
+from typing import Any, Dict, List
+
+import numpy as np
+
+from src.paths import OUTPUT_BASE_DIR
+
+from .search_index import split_chapters, video_url
+
+DEFAULT_INDEX_PATH = os.path.join(OUTPUT_BASE_DIR, 'similarity_index.npz')
+
+N_FEATURES = 1 << 18
+EXCERPT_LENGTH = 280
+
+_WORD_RE = re.compile(r'[a-z0-9_]+|[一-鿿]')
+_FENCE_BLOCK_RE = re.compile(r'```.*?```', re.S)
+
+
+def hash_features(text: str) -> Dict[int, float]:
+    """
+    Hashes word unigrams and bigrams (CJK characters count as words) into `N_FEATURES` buckets.
+
+    Returns `{feature: 1 + log(count)}`.
+    """
+    words = _WORD_RE.findall(text.lower())
+    counts: Dict[int, int] = {}
+    for gram in words + [f'{a} {b}' for a, b in zip(words, words[1:])]:
+        feature = zlib.crc32(gram.encode('utf-8')) % N_FEATURES
+        counts[feature] = counts.get(feature, 0) + 1
+    return {feature: 1 + np.log(count) for feature, count in counts.items()}
+
+
+def make_excerpt(body: str) -> str:
+    text = _FENCE_BLOCK_RE.sub(' ', body)
+    text = ' '.join(line.strip() for line in text.split('\n') if not line.startswith('#'))
+    text = ' '.join(text.split())
+    return text if len(text) <= EXCERPT_LENGTH else text[:EXCERPT_LENGTH].rstrip() + '…'
+
+
+class SimilarityIndex:
+    """
+    Hashed n-gram TF-IDF vectors for every chapter of every crawled session.
+
+    Rows are stored as a CSR matrix (`indptr`, `indices`, `data`) of log term frequencies plus
+    per-feature document frequencies, so sessions can be added without re-reading the others and
+    IDF weights are applied at query time. Queries are scored against all rows at once.
+    """
+
+    def __init__(self, path: str = DEFAULT_INDEX_PATH):
+        self.path = path
+        self.rows: List[Dict[str, Any]] = []
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.indices = np.zeros(0, dtype=np.int32)
+        self.data = np.zeros(0, dtype=np.float32)
+        self.df = np.zeros(N_FEATURES, dtype=np.int32)
+        self._weights: np.ndarray | None = None
+        self.mtime = 0.0
+        if os.path.exists(path):
+            self.load()
+
+    def load(self):
+        with np.load(self.path) as arrays:
+            self.indptr = arrays['indptr']
+            self.indices = arrays['indices']
+            self.data = arrays['data']
+            self.df = arrays['df']
+            self.rows = json.loads(arrays['rows'].tobytes().decode('utf-8'))
+        self.mtime = os.path.getmtime(self.path)
+        self._weights = None
+
+    def save(self):
+        if dirname := os.path.dirname(self.path):
+            os.makedirs(dirname, exist_ok=True)
+        tmp_path = f'{self.path}.{os.getpid()}.tmp.npz'
+        np.savez(tmp_path,
+                 indptr=self.indptr, indices=self.indices, data=self.data, df=self.df,
+                 rows=np.frombuffer(json.dumps(self.rows, ensure_ascii=False).encode('utf-8'), dtype=np.uint8))
+        os.replace(tmp_path, self.path)
+        self.mtime = os.path.getmtime(self.path)
+
+    def has_session(self, year: str, video_id: str) -> bool:
+        return any(row['year'] == year and row['video_id'] == video_id for row in self.rows)
+
+    def remove_session(self, year: str, video_id: str):
+        keep = np.array([not (row['year'] == year and row['video_id'] == video_id) for row in self.rows], dtype=bool)
+        if keep.all():
+            return
+        lengths = np.diff(self.indptr)
+        entry_keep = np.repeat(keep, lengths)
+        np.subtract.at(self.df, self.indices[~entry_keep], 1)
+        self.indices = self.indices[entry_keep]
+        self.data = self.data[entry_keep]
+        self.indptr = np.concatenate([[0], np.cumsum(lengths[keep])]).astype(np.int64)
+        self.rows = [row for row, kept in zip(self.rows, keep) if kept]
+        self._weights = None
+
+    def add_session(self, year: str, video_id: str, markdown: str):
+        """
+        Adds (or replaces) one session, one row per chapter of its original markdown.
+        """
+        self.remove_session(year, video_id)
+        indices, data, lengths = [], [], []
+        for chapter, (title, body) in enumerate(split_chapters(markdown)):
+            if not (features := hash_features(body)):
+                continue
+            keys = np.fromiter(features.keys(), dtype=np.int32, count=len(features))
+            order = np.argsort(keys)
+            indices.append(keys[order])
+            data.append(np.fromiter(features.values(), dtype=np.float32, count=len(features))[order])
+            lengths.append(len(features))
+            self.rows.append({'year': year, 'video_id': video_id, 'chapter': chapter,
+                              'title': title, 'excerpt': make_excerpt(body)})
+        if not lengths:
+            return
+        new_indices = np.concatenate(indices)
+        np.add.at(self.df, new_indices, 1)
+        self.indices = np.concatenate([self.indices, new_indices])
+        self.data = np.concatenate([self.data, *data])
+        self.indptr = np.concatenate([self.indptr, self.indptr[-1] + np.cumsum(lengths)]).astype(np.int64)
+        self._weights = None
+
+    def index_directory(self, output_dir: str = OUTPUT_BASE_DIR) -> int:
+        """
+        Adds every cached original markdown (`<year>/<video_id>.md`). Returns the number of sessions.
+        """
+        added = 0
+        for year in sorted(os.listdir(output_dir)):
+            year_dir = os.path.join(output_dir, year)
+            # caches and indexes next to the years (e.g. `.chapter_summaries`) are not sessions
+            if not year.isdigit() or not os.path.isdir(year_dir):
+                continue
+            for entry in os.scandir(year_dir):
+                video_id = entry.name[:-len('.md')]
+                if entry.name.endswith('.md') and '_' not in video_id:
+                    with open(entry.path, 'r', encoding='utf-8') as file:
+                        self.add_session(year, video_id, file.read())
+                    added += 1
+        return added
+
+    def _idf(self) -> np.ndarray:
+        return np.log((1 + len(self.rows)) / (1 + self.df.astype(np.float32))) + 1
+
+    def _row_weights(self) -> np.ndarray:
+        """TF-IDF weights of the stored entries, L2-normalized per row."""
+        if self._weights is None:
+            weights = self.data * self._idf()[self.indices]
+            norms = np.sqrt(np.add.reduceat(weights * weights, self.indptr[:-1]))
+            self._weights = weights / np.repeat(norms, np.diff(self.indptr))
+        return self._weights
+
+    def query(self, texts: List[str], k: int = 5, exclude_video: tuple[str, str] | None = None) -> List[List[Dict[str, Any]]]:
+        """
+        Returns the top `k` most similar chapters for each text, skipping chapters of `exclude_video`.
+        """
+        if not self.rows or not texts:
+            return [[] for _ in texts]
+        idf = self._idf()
+        queries = np.zeros((len(texts), N_FEATURES), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for feature, weight in hash_features(text).items():
+                queries[i, feature] = weight * idf[feature]
+            if norm := np.linalg.norm(queries[i]):
+                queries[i] /= norm
+
+        # (queries x entries) products summed per row segment gives the cosine similarity matrix
+        scores = np.add.reduceat(queries[:, self.indices] * self._row_weights(), self.indptr[:-1], axis=1)
+        if exclude_video:
+            excluded = np.array([(row['year'], row['video_id']) == exclude_video for row in self.rows])
+            scores[:, excluded] = -1
+
+        results = []
+        for row_scores in scores:
+            top = np.argpartition(-row_scores, min(k, len(row_scores) - 1))[:k]
+            top = top[np.argsort(-row_scores[top])]
+            results.append([{
+                **self.rows[index],
+                'score': float(row_scores[index]),
+                'url': video_url(self.rows[index]['year'], self.rows[index]['video_id']),
+            } for index in top if row_scores[index] > 0])
+        return results
+
+
+_indexes: Dict[str, SimilarityIndex] = {}
+_lock = threading.Lock()
+
+
+def update_session(path: str, year: str, video_id: str, markdown: str):
+    """
+    Incrementally adds a session to the index stored at `path` and saves it.
+
+    Only serialized within the process, callers in several processes must also hold a file lock
+    (see `save_cache`), or the last one to save drops the sessions added by the others.
+    """
+    with _lock:
+        index = _cached_index(path)
+        index.add_session(year, video_id, markdown)
+        index.save()
+
+
+def related_chapters(path: str, text: str, k: int = 3, exclude_video: tuple[str, str] | None = None) -> List[Dict[str, Any]]:
+    with _lock:
+        return _cached_index(path).query([text], k=k, exclude_video=exclude_video)[0]
+
+
+def _cached_index(path: str) -> SimilarityIndex:
+    index = _indexes.get(path)
+    if index is None or (os.path.exists(path) and os.path.getmtime(path) != index.mtime):
+        index = _indexes[path] = SimilarityIndex(path)
+    return index
+
+
+if __name__ == '__main__':
+    index = SimilarityIndex(DEFAULT_INDEX_PATH)
+    index.index_directory()
+    index.save()
+    print(f'{len(index.rows)} chapters indexed into {index.path}')
@@ -0,0 +1,166 @@
+import fcntl
+import json
+
+import httpx
+import pytest
+from openai import AsyncOpenAI
+
+from src.agent import wwdc_translator
+from src.agent.wwdc_translator import CacheType
+from src.bot.wwdc_batch_bot import translate_wwdc_videos_batch_async
+
+pytestmark = pytest.mark.anyio
+
+
+class StandInBatchAPI:
+    """Local stand-in for the Batch API that answers every request by echoing its user message."""
+
+    def __init__(self) -> None:
+        self.files: dict[str, bytes] = {}
+        self.batches: dict[str, dict] = {}
+
+    def _batch(self, batch_id: str) -> dict:
+        return {"id": batch_id, "object": "batch", "endpoint": "/v1/chat/completions",
+                "completion_window": "24h", "created_at": 0, **self.batches[batch_id]}
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        if request.method == "POST" and path.endswith("/files"):
+            file_id = f"file-{len(self.files)}"
+            body = request.content
+            self.files[file_id] = body[body.index(b"{"):body.rindex(b"}") + 1]
+            return httpx.Response(200, json={"id": file_id, "object": "file", "bytes": 0, "created_at": 0,
+                                             "filename": "wwdc_batch.jsonl", "purpose": "batch", "status": "processed"})
+        if request.method == "POST" and path.endswith("/batches"):
+            batch_id = f"batch-{len(self.batches)}"
+            lines = self.files[json.loads(request.content)["input_file_id"]].decode("utf-8").splitlines()
+            output = "\n".join(json.dumps({
+                "custom_id": line["custom_id"],
+                "response": {"status_code": 200, "body": {"choices": [
+                    {"message": {"role": "assistant", "content": line["body"]["messages"][-1]["content"]}}]}},
+            }) for line in map(json.loads, lines))
+            self.files[f"{batch_id}-output"] = output.encode("utf-8")
+            self.batches[batch_id] = {"status": "in_progress", "input_file_id": "", "output_file_id": None}
+            return httpx.Response(200, json=self._batch(batch_id))
+        if request.method == "GET" and "/batches/" in path:
+            batch_id = path.rsplit("/", 1)[-1]
+            self.batches[batch_id].update(status="completed", output_file_id=f"{batch_id}-output")
+            return httpx.Response(200, json=self._batch(batch_id))
+        if request.method == "GET" and path.endswith("/content"):
+            return httpx.Response(200, content=self.files[path.split("/")[-2]])
+        return httpx.Response(404)
+
+
+async def test_batch_run_fills_cache_layout(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(wwdc_translator, "OUTPUT_BASE_DIR", str(tmp_path))
+    monkeypatch.setattr(wwdc_translator, "TRANSLATION_MEMORY_PATH", str(tmp_path / "tm.sqlite3"))
+    await wwdc_translator.save_cache("2025", "101", CacheType.ORIGINAL_MARKDOWN, "# Title\n\nHello there.")
+
+    api = StandInBatchAPI()
+    client = AsyncOpenAI(base_url="http://batch.local/v1", api_key="test",
+                         http_client=httpx.AsyncClient(transport=httpx.MockTransport(api.handler)))
+    videos = [{"url": "https://developer.apple.com/videos/play/wwdc2025/101/"}]
+    await translate_wwdc_videos_batch_async(videos, poll_interval=0, write_blog_posts=False, client=client)
+
+    assert await wwdc_translator.get_cache("2025", "101", CacheType.TRANSLATED_MARKDOWN) == "# Title\n\nHello there."
+    assert await wwdc_translator.get_cache("2025", "101", CacheType.REWRITED_MARKDOWN)
+    assert await wwdc_translator.get_cache("2025", "101", CacheType.PODCAST_SCRIPT)
+    # translations first, then rewrite and podcast together
+    assert len(api.batches) == 2
+
+
+async def test_batch_run_writes_podcast_without_live_summaries(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(wwdc_translator, "OUTPUT_BASE_DIR", str(tmp_path))
+    monkeypatch.setattr(wwdc_translator, "TRANSLATION_MEMORY_PATH", str(tmp_path / "tm.sqlite3"))
+    monkeypatch.setenv("WWDC_PODCAST_MAP_REDUCE", "1")
+
+    async def live_call(config, prompt, content):
+        raise AssertionError("batch runs must not make live model calls")
+
+    monkeypatch.setattr(wwdc_translator, "run_agent", live_call)
+    markdown = "# Title\n\nHello there.\n\n## One\n\nFirst chapter.\n\n## Two\n\nSecond chapter."
+    await wwdc_translator.save_cache("2025", "101", CacheType.ORIGINAL_MARKDOWN, markdown)
+
+    api = StandInBatchAPI()
+    client = AsyncOpenAI(base_url="http://batch.local/v1", api_key="test",
+                         http_client=httpx.AsyncClient(transport=httpx.MockTransport(api.handler)))
+    videos = [{"url": "https://developer.apple.com/videos/play/wwdc2025/101/"}]
+    await translate_wwdc_videos_batch_async(videos, poll_interval=0, write_blog_posts=False, client=client)
+
+    # the stand-in echoes its input, so the podcast was written from the whole translation
+    assert await wwdc_translator.get_cache("2025", "101", CacheType.PODCAST_SCRIPT) == markdown
+    assert not (tmp_path / ".chapter_summaries").exists()
+
+
+async def test_batch_run_covers_every_locale(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(wwdc_translator, "OUTPUT_BASE_DIR", str(tmp_path))
+    monkeypatch.setattr(wwdc_translator, "TRANSLATION_MEMORY_PATH", str(tmp_path / "tm.sqlite3"))
+    monkeypatch.setenv("WWDC_LOCALES", "zh,ja")
+    await wwdc_translator.save_cache("2025", "101", CacheType.ORIGINAL_MARKDOWN, "# Title\n\nHello there.")
+
+    api = StandInBatchAPI()
+    client = AsyncOpenAI(base_url="http://batch.local/v1", api_key="test",
+                         http_client=httpx.AsyncClient(transport=httpx.MockTransport(api.handler)))
+    videos = [{"url": "https://developer.apple.com/videos/play/wwdc2025/101/"}]
+    await translate_wwdc_videos_batch_async(videos, poll_interval=0, write_blog_posts=False, client=client)
+
+    for locale in ("zh", "ja"):
+        assert await wwdc_translator.get_cache("2025", "101", CacheType.TRANSLATED_MARKDOWN, locale=locale)
+        assert await wwdc_translator.get_cache("2025", "101", CacheType.REWRITED_MARKDOWN, locale=locale)
+    custom_ids = [json.loads(line)["custom_id"] for file in api.files.values() for line in file.decode().splitlines()
+                  if "custom_id" in line and "messages" in line]
+    assert sorted(custom_ids) == sorted(["2025:101:translated_markdown:zh", "2025:101:translated_markdown:ja",
+                                         "2025:101:rewrited_markdown:zh", "2025:101:rewrited_markdown:ja",
+                                         "2025:101:podcast_script:zh"])
+
+
+async def test_batch_requests_follow_the_routing_rules(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(wwdc_translator, "OUTPUT_BASE_DIR", str(tmp_path))
+    monkeypatch.setattr(wwdc_translator, "TRANSLATION_MEMORY_PATH", str(tmp_path / "tm.sqlite3"))
+    monkeypatch.setenv("LLM_MODEL", "large")
+    monkeypatch.setenv("LLM_ROUTES", json.dumps([{"stage": "rewrite", "model": "small"}]))
+    await wwdc_translator.save_cache("2025", "101", CacheType.ORIGINAL_MARKDOWN, "# Title\n\nHello there.")
+
+    api = StandInBatchAPI()
+    client = AsyncOpenAI(base_url="http://batch.local/v1", api_key="test",
+                         http_client=httpx.AsyncClient(transport=httpx.MockTransport(api.handler)))
+    videos = [{"url": "https://developer.apple.com/videos/play/wwdc2025/101/"}]
+    await translate_wwdc_videos_batch_async(videos, poll_interval=0, write_blog_posts=False, client=client)
+
+    models = {json.loads(line)["custom_id"].split(":")[2]: json.loads(line)["body"]["model"]
+              for file in api.files.values() for line in file.decode().splitlines() if "messages" in line}
+    assert models == {"translated_markdown": "large", "rewrited_markdown": "small", "podcast_script": "large"}
+    # the rewrite went out in a batch of its own
+    assert len(api.batches) == 3
+
+
+async def test_batch_holds_stage_locks_until_results_are_saved(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(wwdc_translator, "OUTPUT_BASE_DIR", str(tmp_path))
+    monkeypatch.setattr(wwdc_translator, "TRANSLATION_MEMORY_PATH", str(tmp_path / "tm.sqlite3"))
+    await wwdc_translator.save_cache("2025", "101", CacheType.ORIGINAL_MARKDOWN, "# Title\n\nHello there.")
+    lock_path = tmp_path / "2025" / ".locks" / "101_zh.md.lock"
+
+    def locked() -> bool:
+        with open(lock_path, "a") as file:
+            try:
+                fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return True
+            fcntl.flock(file, fcntl.LOCK_UN)
+            return False
+
+    api = StandInBatchAPI()
+    held = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.method == "POST" and request.url.path.endswith("/batches"):
+            held.append(locked())
+        return api.handler(request)
+
+    client = AsyncOpenAI(base_url="http://batch.local/v1", api_key="test",
+                         http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    videos = [{"url": "https://developer.apple.com/videos/play/wwdc2025/101/"}]
+    await translate_wwdc_videos_batch_async(videos, poll_interval=0, write_blog_posts=False, client=client)
+
+    # a live run of the translation waits while its batch request is in flight, and not after
+    assert held[0] and not locked()
@@ -0,0 +1,13 @@
+import subprocess
+import sys
+
+import pytest
+
+from benchmarks.import_time import BUDGETS_MS, DEFERRED_MODULES
+
+
+@pytest.mark.parametrize("module", list(BUDGETS_MS))
+def test_entry_points_defer_heavy_imports(module: str) -> None:
+    code = f"import sys, {module}; print(','.join(m for m in {DEFERRED_MODULES!r} if m in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == ""
@@ -0,0 +1,36 @@
+from src.tools.scrapy_spider.markdown_builder import MarkdownDocument, build_wwdc_document
+
+SESSION = {
+    "detail": {"title": "Title", "description": "Description", "chapters": []},
+    "transcript": [
+        {"start_time": "1", "text": "Hello there. "},
+        {"start_time": "5", "text": "More text. "},
+    ],
+    "sample_codes": [{"start_time": "3", "description": "Sample", "code": "let a = 1"}],
+    "related_videos": [{"title": "Video", "url": "https://example.com/video"}],
+}
+
+
+def _squash(text: str) -> str:
+    return " ".join(text.split())
+
+
+def test_prompt_text_keeps_code_and_links_out_of_llm_input() -> None:
+    document = build_wwdc_document(SESSION)
+    prompt = document.prompt_text()
+    assert "let a = 1" not in prompt
+    assert "Related Videos" not in prompt
+    assert "<!-- passthrough:0 -->" in prompt
+    assert _squash(document.splice(prompt)) == _squash(document.to_markdown())
+
+
+def test_from_markdown_recovers_passthrough_segments() -> None:
+    markdown = build_wwdc_document(SESSION).to_markdown()
+    document = MarkdownDocument.from_markdown(markdown)
+    assert document.passthrough() == [
+        "```\nlet a = 1\n```",
+        "# Related Videos\n\n[Video](https://example.com/video)",
+    ]
+    # a dropped placeholder is still restored, ahead of the trailing link list
+    spliced = document.splice("# Title\n\nTranslated text.")
+    assert spliced.index("let a = 1") < spliced.index("Related Videos")
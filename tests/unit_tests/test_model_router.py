@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+from src.agent import wwdc_translator
+from src.agent.metrics import metrics
+from src.agent.model_router import content_kind, estimate_tokens, select_endpoints
+from src.agent.wwdc_translator import LLMRequest, resolve_request
+
+CONFIG = {"configurable": {
+    "model": "large", "base_url": "https://primary/v1", "api_key": "key",
+    "routes": [
+        {"stage": "translate", "max_tokens": 50, "model": "small"},
+        {"stage": "rewrite", "content": "code", "model": "coder", "base_url": "https://coder/v1"},
+    ],
+    "fallback_model": "backup", "fallback_base_url": "https://backup/v1",
+}}
+
+PROSE = "A short sentence about layout."
+CODE = "Use the modifier:\n\n<!-- passthrough:0 -->\n\nThen call `body` again."
+
+
+def test_content_is_classified_and_routed() -> None:
+    assert content_kind(PROSE) == "prose"
+    assert content_kind(CODE) == "code"
+    assert estimate_tokens("布局" + "a" * 8) == 4
+
+    assert [endpoint.model for endpoint in select_endpoints(CONFIG, "translate", PROSE)] == ["small", "backup"]
+    assert select_endpoints(CONFIG, "translate", PROSE * 20)[0].model == "large"
+    [coder, backup] = select_endpoints(CONFIG, "rewrite", CODE)
+    assert (coder.model, coder.base_url, coder.api_key) == ("coder", "https://coder/v1", "key")
+    assert backup.base_url == "https://backup/v1"
+    assert select_endpoints(CONFIG, "rewrite", PROSE)[0].model == "large"
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+@pytest.mark.anyio
+async def test_saturated_endpoint_falls_back(monkeypatch) -> None:
+    metrics.reset()
+    calls = []
+
+    async def fake_agent(config, prompt, content):
+        calls.append(config["configurable"]["model"])
+        if config["configurable"]["model"] == "small":
+            raise RateLimitError("slow down")
+        return content.upper()
+
+    async def finish(content: str) -> str:
+        return content
+
+    monkeypatch.setattr(wwdc_translator, "run_agent", fake_agent)
+    result = await resolve_request(CONFIG, LLMRequest("prompt", PROSE, finish, stage="translate"))
+
+    assert result == PROSE.upper()
+    assert calls == ["small", "backup"]
+    summary = metrics.summary()
+    assert summary["small"]["errors"] == 1
+    assert summary["backup (fallback)"]["fallbacks"] == 1
+    assert summary["backup (fallback)"]["p95"] is not None
+
+
+def slow_agent(delays: dict, calls: list):
+    async def agent(config, prompt, content):
+        model = config["configurable"]["model"]
+        calls.append(model)
+        try:
+            await asyncio.sleep(delays[model])
+        except asyncio.CancelledError:
+            calls.append(f"{model} cancelled")
+            raise
+        return model
+    return agent
+
+
+async def finish(content: str) -> str:
+    return content
+
+
+@pytest.mark.anyio
+async def test_slow_call_is_hedged_and_cancelled(monkeypatch) -> None:
+    metrics.reset()
+    calls = []
+    monkeypatch.setattr(wwdc_translator, "run_agent", slow_agent({"large": 5, "backup": 0}, calls))
+    config = {"configurable": {**CONFIG["configurable"], "routes": [],
+                               "hedge_requests": True, "hedge_delay": 0.05}}
+
+    assert await resolve_request(config, LLMRequest("prompt", PROSE, finish)) == "backup"
+    await asyncio.sleep(0)
+    assert calls == ["large", "backup", "large cancelled"]
+    assert metrics.summary()["backup (fallback)"]["hedges"] == 1
+    assert metrics.summary()["backup (fallback)"]["hedge_wins"] == 1
+
+
+@pytest.mark.anyio
+async def test_stuck_calls_hit_their_deadline(monkeypatch) -> None:
+    metrics.reset()
+    monkeypatch.setattr(wwdc_translator, "run_agent", slow_agent({"large": 5}, []))
+    config = {"configurable": {"model": "large", "call_timeout": 0.05}}
+
+    with pytest.raises(asyncio.TimeoutError, match="within 0.05s"):
+        await resolve_request(config, LLMRequest("prompt", PROSE, finish))
+    assert metrics.summary()["large"]["timeouts"] == 1
@@ -0,0 +1,89 @@
+import pytest
+
+from src.agent import wwdc_translator
+from src.agent.output_check import Completion, check_output
+from src.agent.translation_memory import TranslationMemory, format_segments_request
+from src.agent.wwdc_translator import LLMRequest, checked, prepare_translation, resolve_request
+from src.tools.scrapy_spider.markdown_builder import MarkdownDocument
+
+SOURCE = "# Title\n\nIntro.\n\n<!-- passthrough:0 -->\n\n## Chapter\n\nBody.\n\n<!-- passthrough:1 -->"
+PARTIAL = "# 标题\n\n简介。\n\n<!-- passthrough:0 -->\n\n## 章节\n\n正"
+REST = "正文。\n\n<!-- passthrough:1 -->"
+
+
+def test_structure_is_compared_with_the_source() -> None:
+    assert check_output(SOURCE, SOURCE).ok
+    assert check_output(SOURCE, SOURCE, finish_reason="length").truncated
+
+    cut = check_output(SOURCE, PARTIAL)
+    assert cut.truncated and cut.problems == ["1 of 2 placeholders are missing"]
+
+    dropped = check_output(SOURCE, SOURCE.replace("<!-- passthrough:0 -->", ""))
+    assert not dropped.ok and not dropped.truncated
+    assert check_output(SOURCE, "# Title\n\n```swift\nlet a = 1").truncated
+    assert check_output(SOURCE, "Intro. <!-- passthrough:0 --> <!-- passthrough:1 -->", headings=False).ok
+
+
+async def finish(content: str) -> str:
+    return content
+
+
+@pytest.mark.anyio
+async def test_truncated_answer_is_continued(monkeypatch) -> None:
+    calls = []
+
+    async def fake_agent(config, prompt, content):
+        calls.append((prompt, content))
+        return Completion(PARTIAL, "length") if len(calls) == 1 else Completion(REST, "stop")
+
+    monkeypatch.setattr(wwdc_translator, "run_agent", fake_agent)
+    config = {"configurable": {"model": "large"}}
+    result = await resolve_request(config, checked(config, LLMRequest("translate", SOURCE, finish), SOURCE))
+
+    # the continuation picks up after the last complete paragraph
+    assert result == "# 标题\n\n简介。\n\n<!-- passthrough:0 -->\n\n## 章节\n\n" + REST
+    prompt, content = calls[1]
+    assert prompt.startswith("translate") and "# 续写" in prompt
+    assert content.startswith(SOURCE) and content.endswith("# 已输出部分的结尾\n# 标题\n\n简介。\n\n<!-- passthrough:0 -->\n\n## 章节")
+
+
+@pytest.mark.anyio
+async def test_malformed_answer_is_requested_again_a_bounded_number_of_times(monkeypatch) -> None:
+    calls = []
+    malformed = SOURCE.replace("<!-- passthrough:0 -->", "")
+
+    async def fake_agent(config, prompt, content):
+        calls.append(content)
+        return malformed
+
+    monkeypatch.setattr(wwdc_translator, "run_agent", fake_agent)
+    config = {"configurable": {"model": "large", "output_repairs": 1}}
+    result = await resolve_request(config, checked(config, LLMRequest("translate", SOURCE, finish), SOURCE))
+
+    assert result == malformed
+    assert calls == [SOURCE, SOURCE]
+
+
+@pytest.mark.anyio
+async def test_truncated_segment_answer_requests_only_missing_segments(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(wwdc_translator, "TRANSLATION_MEMORY_PATH", str(tmp_path / "tm.sqlite3"))
+    calls = []
+
+    async def fake_agent(config, prompt, content):
+        calls.append(content)
+        if len(calls) == 1:
+            return Completion("<<1>>\n标题\n<<2>>\n你好。\n<<3>>\n欢迎来", "length")
+        return Completion("<<1>>\n欢迎来到 WWDC。", "stop")
+
+    monkeypatch.setattr(wwdc_translator, "run_agent", fake_agent)
+    config = {"configurable": {"model": "large"}}
+    markdown = "# Title\n\nHello there. Welcome to WWDC."
+    document = MarkdownDocument.from_markdown(markdown)
+
+    result = await resolve_request(config, await prepare_translation(markdown, document, config))
+
+    assert result == "# 标题\n\n你好。欢迎来到 WWDC。"
+    # the cut-off last segment is dropped and requested alone, the others are kept in the memory
+    assert calls[1] == format_segments_request(["Welcome to WWDC."])
+    memory = TranslationMemory(str(tmp_path / "tm.sqlite3"))
+    assert len(memory.lookup(["Title", "Hello there.", "Welcome to WWDC."])) == 3
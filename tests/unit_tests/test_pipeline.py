@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+
+from src.agent import wwdc_translator
+from src.agent.wwdc_pipeline import run_pipeline
+from src.agent.wwdc_translator import CacheType, State
+
+pytestmark = pytest.mark.anyio
+
+MARKDOWN = "# Title\n\nIntro.\n\n## First\n\nOne.\n\n```swift\nlet a = 1\n```\n\n## Second\n\nTwo."
+
+
+async def crawled_state() -> State:
+    await wwdc_translator.save_cache("2025", "101", CacheType.ORIGINAL_MARKDOWN, MARKDOWN)
+    return State(markdown=wwdc_translator.artifact_ref(CacheType.ORIGINAL_MARKDOWN, MARKDOWN))
+
+
+async def test_pipeline_rewrites_chapters_in_order(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(wwdc_translator, "OUTPUT_BASE_DIR", str(tmp_path))
+
+    async def fake_agent(config, prompt, content):
+        return content.upper()
+
+    monkeypatch.setattr(wwdc_translator, "run_agent", fake_agent)
+    config = {"configurable": {"year": "2025", "video_id": "101", "use_cache": True,
+                               "use_translation_memory": False}}
+    events = []
+    result = await run_pipeline(await crawled_state(), config, emit=events.append)
+
+    translated = await wwdc_translator.load_artifact(config, result["translated_markdown"])
+    assert translated == MARKDOWN.upper().replace("LET A = 1", "let a = 1").replace("```SWIFT", "```swift")
+    assert result["rewrited_markdown"].sha1 == result["translated_markdown"].sha1
+    assert {(event["stage"], event["chunk"]) for event in events} == {
+        (stage, index) for stage in ("translate", "rewrite") for index in range(3)}
+    assert await wwdc_translator.get_cache("2025", "101", CacheType.REWRITED_MARKDOWN) == translated
+
+
+async def test_locales_fan_out_from_one_document(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(wwdc_translator, "OUTPUT_BASE_DIR", str(tmp_path))
+    prompts = []
+
+    async def fake_agent(config, prompt, content):
+        prompts.append(prompt)
+        return content.upper()
+
+    monkeypatch.setattr(wwdc_translator, "run_agent", fake_agent)
+    config = {"configurable": {"year": "2025", "video_id": "101", "use_cache": True,
+                               "use_translation_memory": False, "locales": ["zh", "ja"]}}
+    state = await crawled_state()
+    state = state.model_copy(update=await wwdc_translator.translate_markdown(state, config))
+    state = state.model_copy(update=await wwdc_translator.rewrite_markdown(state, config))
+
+    assert set(state.translations) == set(state.rewrites) == {"zh", "ja"}
+    assert state.translated_markdown == state.translations["zh"]
+    assert any("日语 (ja-JP)" in prompt for prompt in prompts)
+    assert all("{language}" not in prompt for prompt in prompts)
+    assert await wwdc_translator.get_cache("2025", "101", CacheType.REWRITED_MARKDOWN, locale="ja") \
+        == await wwdc_translator.load_artifact(config, state.rewrites["ja"])
+    assert (tmp_path / "2025" / "101_ja_rewrite.md").exists()
+
+
+async def test_graph_streams_small_updates(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(wwdc_translator, "OUTPUT_BASE_DIR", str(tmp_path))
+
+    async def fake_agent(config, prompt, content):
+        return content.upper()
+
+    monkeypatch.setattr(wwdc_translator, "run_agent", fake_agent)
+    long_markdown = MARKDOWN + "\n\n## Third\n\n" + "Long paragraph. " * 20000
+    await wwdc_translator.save_cache("2025", "101", CacheType.ORIGINAL_MARKDOWN, long_markdown)
+    config = {"configurable": {"year": "2025", "video_id": "101", "use_cache": True,
+                               "use_translation_memory": False, "locales": ["zh", "ja"]}}
+
+    updates = [update async for update in wwdc_translator.graph.astream({}, config=config, stream_mode="updates")]
+
+    assert [next(iter(update)) for update in updates] == ["crawl_wwdc_markdown", "translate_markdown", "rewrite_markdown"]
+    assert all(len(repr(update)) < 2000 for update in updates)
+    assert (tmp_path / "2025" / "101_ja_rewrite.md").stat().st_size > len(long_markdown)
+
+
+async def test_failed_chunk_cancels_the_rest_of_the_video(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(wwdc_translator, "OUTPUT_BASE_DIR", str(tmp_path))
+
+    async def fake_agent(config, prompt, content):
+        if "Second" in content:
+            raise RuntimeError("chunk failed")
+        return content.upper()
+
+    monkeypatch.setattr(wwdc_translator, "run_agent", fake_agent)
+    config = {"configurable": {"year": "2025", "video_id": "101", "use_cache": True,
+                               "use_translation_memory": False, "write_podcast_script": True}}
+
+    with pytest.raises(RuntimeError, match="chunk failed"):
+        await run_pipeline(await crawled_state(), config, emit=lambda event: None)
+    # the podcast task waiting for the failed chunk is not left behind
+    assert not [task for task in asyncio.all_tasks() if "_run_chapters" in task.get_coro().__qualname__]
+    assert not (tmp_path / "2025" / "101_podcast.json").exists()
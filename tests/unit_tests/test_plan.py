@@ -0,0 +1,32 @@
+import os
+
+from src.bot.wwdc_plan import PROMPTS_DIR, estimate_wall_time, plan_year
+
+MARKDOWN = "# Title\n\nIntro text.\n\n```swift\nlet a = 1\n```\n"
+
+
+def count_words(texts):
+    return [len(text.split()) for text in texts]
+
+
+def test_plan_counts_cached_and_pending_stages(tmp_path) -> None:
+    year_dir = tmp_path / "output" / "2025"
+    crawl_dir = tmp_path / "crawl" / "2025"
+    year_dir.mkdir(parents=True)
+    crawl_dir.mkdir(parents=True)
+    (year_dir / "101.md").write_text(MARKDOWN)
+    (year_dir / "101_zh.md").write_text("标题 简介 正文 更多")
+    (year_dir / "101_zh_rewrite.md").write_text("done")
+    (crawl_dir / "102_cn.md").write_text(MARKDOWN)
+
+    plans = plan_year("2025", ["101", "102", "103"], ["zh"], output_dir=str(tmp_path / "output"),
+                      crawl_dir=str(tmp_path / "crawl"), count_tokens=count_words)
+
+    assert (plans["crawl"].cached, plans["crawl"].pending) == (1, 2)
+    assert (plans["translate"].cached, plans["translate"].pending, plans["translate"].extrapolated) == (1, 2, 1)
+    assert (plans["rewrite"].cached, plans["rewrite"].pending) == (1, 2)
+    # code blocks never reach the model, the uncrawled session is assumed to be as long as the crawled one
+    with open(os.path.join(PROMPTS_DIR, "wwdc_translator.md"), encoding="utf-8") as file:
+        [prompt] = count_words([file.read()])
+    assert plans["translate"].input_tokens == 2 * (prompt + len("# Title Intro text.".split()))
+    assert estimate_wall_time(plans, concurrency=1, tpm=None, output_tps=1) > 0
@@ -0,0 +1,63 @@
+import pytest
+
+from src.agent import wwdc_translator
+from src.agent.wwdc_translator import CacheType, prepare_podcast_script, resolve_request
+from src.bot.wwdc_translator_bot import _video_config
+from src.tools.scrapy_spider.markdown_builder import MarkdownDocument
+
+TRANSLATION = "# 标题\n\n简介。\n\n## 第一章\n\n内容一。\n\n## 第二章\n\n内容二。"
+
+
+@pytest.mark.anyio
+async def test_podcast_is_written_from_cached_chapter_summaries(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(wwdc_translator, "OUTPUT_BASE_DIR", str(tmp_path))
+    calls = []
+    models = []
+
+    async def fake_agent(config, prompt, content):
+        calls.append(content)
+        models.append(config["configurable"]["model"])
+        if "podcast" in prompt.lower():
+            return "script"
+        return f"摘要：{content.splitlines()[-1]}"
+
+    monkeypatch.setattr(wwdc_translator, "run_agent", fake_agent)
+    config = {"configurable": {"model": "large", "podcast_map_reduce": True,
+                               "routes": [{"stage": "summarize", "model": "small"}]}}
+    document = MarkdownDocument.from_markdown(TRANSLATION)
+
+    request = await prepare_podcast_script(TRANSLATION, document, config)
+    assert await resolve_request(config, request) == "script"
+    assert sorted(calls[:3]) == sorted(chunk.to_markdown() for chunk in document.split_chapters())
+    assert models == ["small", "small", "small", "large"]
+    assert len(list((tmp_path / ".chapter_summaries").iterdir())) == 3
+    assert calls[3] == request.content == ("# 标题\n\n摘要：简介。\n\n## 第一章\n\n摘要：内容一。\n\n"
+                                           "## 第二章\n\n摘要：内容二。")
+
+    # summaries are cached per chapter, regenerating the script only makes the final call
+    calls.clear()
+    await resolve_request(config, await prepare_podcast_script(TRANSLATION, document, config))
+    assert calls == [request.content]
+
+
+@pytest.mark.anyio
+async def test_bot_config_runs_map_reduce_through_the_graph(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(wwdc_translator, "OUTPUT_BASE_DIR", str(tmp_path))
+    monkeypatch.setenv("WWDC_PODCAST", "1")
+    monkeypatch.setenv("WWDC_PODCAST_MAP_REDUCE", "1")
+    prompts = []
+
+    async def fake_agent(config, prompt, content):
+        prompts.append(prompt)
+        return "script" if "podcast" in prompt.lower() else content
+
+    monkeypatch.setattr(wwdc_translator, "run_agent", fake_agent)
+    await wwdc_translator.save_cache("2025", "101", CacheType.ORIGINAL_MARKDOWN, TRANSLATION)
+    config = _video_config("2025", "101")
+    config["configurable"]["use_translation_memory"] = False
+
+    result = await wwdc_translator.graph.ainvoke({}, config=config)
+
+    assert await wwdc_translator.load_artifact(config, result["podcast_script"]) == "script"
+    assert len(list((tmp_path / ".chapter_summaries").iterdir())) == 3
+    assert await wwdc_translator.get_cache("2025", "101", CacheType.PODCAST_SCRIPT) == "script"
@@ -0,0 +1,83 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+import pytest
+
+from src.agent import profiling
+from src.agent.profiling import LoopMonitor, profile_call, profiled
+
+pytestmark = pytest.mark.anyio
+
+
+def make_config(profile: bool) -> dict:
+    return {"configurable": {"year": "2025", "video_id": "101", "profile": profile}}
+
+
+async def wait_for_model() -> str:
+    await asyncio.sleep(0.1)
+    return "done"
+
+
+@profiled
+async def node(state, config):
+    return await wait_for_model()
+
+
+def build() -> str:
+    time.sleep(0.1)
+    return "built"
+
+
+async def test_profiled_video_writes_folded_stacks(tmp_path, monkeypatch) -> None:
+    monkeypatch.delenv("WWDC_PROFILE", raising=False)
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(profiling, "_profiles", OrderedDict())
+
+    assert await node(None, make_config(profile=False)) == "done"
+    assert not (tmp_path / "2025").exists()
+
+    assert await node(None, make_config(profile=True)) == "done"
+    assert await asyncio.to_thread(profile_call, make_config(profile=True), "crawl", build) == "built"
+
+    lines = (tmp_path / "2025" / "101.folded").read_text().splitlines()
+    stacks = {line.rsplit(" ", 1)[0]: int(line.rsplit(" ", 1)[1]) for line in lines}
+    assert any(stack.startswith("node (") and "wait_for_model (" in stack and stack.endswith(";<waiting>")
+               for stack in stacks)
+    assert any(stack.startswith("crawl;") and ";build (" in stack for stack in stacks)
+    assert all(count > 0 for count in stacks.values())
+
+
+async def test_cprofile_mode_dumps_stats(tmp_path, monkeypatch) -> None:
+    monkeypatch.setenv("WWDC_PROFILE", "cprofile")
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(profiling, "_profiles", OrderedDict())
+
+    assert profile_call(make_config(profile=False), "crawl", build) == "built"
+    assert (tmp_path / "2025" / "101.crawl.prof").exists()
+
+
+async def test_loop_monitor_sees_blocked_loop() -> None:
+    async with LoopMonitor(interval=0.01) as monitor:
+        await asyncio.sleep(0.05)
+        time.sleep(0.1)
+        await asyncio.sleep(0.05)
+
+    summary = monitor.summary()
+    assert summary["samples"] > 0
+    assert summary["lag_max_ms"] >= 50
+    assert summary["tasks_max"] >= 2
+
+
+def test_only_recent_video_profiles_are_kept(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(profiling, "_profiles", OrderedDict())
+    first = profiling.video_profile(make_config(profile=True))
+
+    for video_id in range(profiling.PROFILE_MEMORY_SIZE):
+        profiling.video_profile({"configurable": {"year": "2024", "video_id": str(video_id)}})
+        assert profiling.video_profile(make_config(profile=True)) is first
+
+    profiling.video_profile({"configurable": {"year": "2024", "video_id": "last"}})
+    assert len(profiling._profiles) == profiling.PROFILE_MEMORY_SIZE
+    assert ("2024", "0") not in profiling._profiles
@@ -0,0 +1,44 @@
+from src.tools.search_index import SearchIndex
+
+MARKDOWN = "# Meet SwiftUI\n\nIntro.\n\n## Layout\n\nUse ViewThatFits to adapt.\n\n## Animation\n\n使用动画让界面更生动。"
+
+
+def test_search_returns_chapter_snippets_with_deep_links(tmp_path) -> None:
+    index = SearchIndex(str(tmp_path / "search.sqlite3"))
+    index.record_chapter_times("2025", "101", [("Layout", 30.0), ("Animation", 95.5)])
+    assert index.index_artifact("2025", "101", "original_markdown", MARKDOWN)
+    assert not index.index_artifact("2025", "101", "original_markdown", MARKDOWN)
+
+    [result] = index.search("ViewThatFits")
+    assert result["title"] == "Layout"
+    assert "**ViewThatFits**" in result["snippet"]
+    assert result["url"] == "https://developer.apple.com/videos/play/wwdc2025/101/?time=30"
+
+    # short CJK terms fall back to substring matching
+    [result] = index.search("动画")
+    assert result["chapter"] == 2
+    assert index.search("ViewThatFits", year="2024") == []
+
+
+def test_index_directory_names_locales(tmp_path) -> None:
+    (tmp_path / "2025").mkdir()
+    for name in ("101.md", "101_zh.md", "101_ja_rewrite.md", "101_podcast.json"):
+        (tmp_path / "2025" / name).write_text(MARKDOWN, encoding="utf-8")
+    index = SearchIndex(str(tmp_path / "search.sqlite3"))
+
+    assert index.index_directory(str(tmp_path)) == 3
+    kinds = {result["kind"] for result in index.search("ViewThatFits")}
+    assert kinds == {"original_markdown", "translated_markdown", "rewrited_markdown_ja"}
+
+
+def test_index_directory_skips_caches_next_to_years(tmp_path) -> None:
+    (tmp_path / "2025").mkdir()
+    (tmp_path / "2025" / "101.md").write_text(MARKDOWN, encoding="utf-8")
+    for directory in (".chapter_summaries", "chapter_summaries"):
+        (tmp_path / directory).mkdir()
+        (tmp_path / directory / f"{'a' * 40}.md").write_text(MARKDOWN, encoding="utf-8")
+    index = SearchIndex(str(tmp_path / "search.sqlite3"))
+
+    assert index.index_directory(str(tmp_path)) == 1
+    assert {result["url"] for result in index.search("ViewThatFits")} == {
+        "https://developer.apple.com/videos/play/wwdc2025/101/"}
@@ -0,0 +1,25 @@
+from math import inf
+
+from src.tools.scrapy_spider.markdown_builder import WWDCSession, build_wwdc_markdown
+
+CRAWLED = {
+    "detail": {"title": "Title", "description": "Description", "chapters": [
+        {"start_time": "0", "end_time": None, "index": "0", "title": "Intro"},
+    ]},
+    "transcript": [{"start_time": "1.5", "text": "Hello. "}, {"start_time": 4, "text": None}],
+    "sample_codes": [{"start_time": "2", "description": "Sample", "code": "let a = 1"}],
+    "documents": [{"title": "Doc", "url": "https://example.com/doc"}],
+}
+
+
+def test_session_parses_times_once_and_round_trips() -> None:
+    session = WWDCSession.from_dict(CRAWLED)
+    assert list(session.transcript) == [(1.5, "Hello. "), (4.0, "")]
+    assert session.chapters[0].index == 0
+    assert session.chapters[0].end_time == inf
+
+    restored = WWDCSession.from_bytes(session.to_bytes())
+    assert list(restored.transcript) == list(session.transcript)
+    assert restored.chapters[0].end_time == inf
+    assert build_wwdc_markdown(restored) == build_wwdc_markdown(CRAWLED)
+    assert "## Intro" in build_wwdc_markdown(restored)
@@ -0,0 +1,46 @@
+import pytest
+
+from src.agent import wwdc_translator
+from src.agent.wwdc_translator import CacheType, get_cache, save_cache
+from src.tools.similarity_index import SimilarityIndex
+
+
+def test_related_chapters_across_sessions(tmp_path) -> None:
+    path = str(tmp_path / "similarity.npz")
+    index = SimilarityIndex(path)
+    index.add_session("2025", "101", "# SwiftUI\n\nIntro.\n\n## Layout\n\nGrid layout with lazy stacks and ViewThatFits.")
+    index.add_session("2025", "102", "# Metal\n\nIntro.\n\n## Shaders\n\nCompile shaders and tune the GPU pipeline.")
+    index.add_session("2024", "201", "# Layout\n\nLazy stacks and grid layout performance in SwiftUI.")
+    index.save()
+
+    reloaded = SimilarityIndex(path)
+    [related] = reloaded.query(["lazy stacks grid layout"], k=2, exclude_video=("2025", "101"))
+    assert [(row["year"], row["video_id"]) for row in related] == [("2024", "201")]
+    assert related[0]["url"] == "https://developer.apple.com/videos/play/wwdc2024/201/"
+
+    # re-adding a session replaces its chapters
+    reloaded.add_session("2024", "201", "# Metal\n\nShaders.")
+    assert [row["title"] for row in reloaded.rows if row["video_id"] == "201"] == ["Metal"]
+    assert reloaded.query(["lazy stacks grid layout"], k=2, exclude_video=("2025", "101")) == [[]]
+
+
+@pytest.mark.anyio
+async def test_broken_index_does_not_fail_the_crawl(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(wwdc_translator, "OUTPUT_BASE_DIR", str(tmp_path))
+    (tmp_path / "similarity_index.npz").write_bytes(b"not a zip")
+
+    await save_cache("2025", "101", CacheType.ORIGINAL_MARKDOWN, "# SwiftUI\n\nIntro.")
+    assert await get_cache("2025", "101", CacheType.ORIGINAL_MARKDOWN) == "# SwiftUI\n\nIntro."
+
+
+def test_index_directory_skips_caches_next_to_years(tmp_path) -> None:
+    (tmp_path / "2025").mkdir()
+    (tmp_path / "2025" / "101.md").write_text("# SwiftUI\n\nGrid layout with lazy stacks.", encoding="utf-8")
+    (tmp_path / ".chapter_summaries").mkdir()
+    (tmp_path / ".chapter_summaries" / f"{'a' * 40}.md").write_text("Lazy stacks summary.", encoding="utf-8")
+    (tmp_path / "chapter_summaries").mkdir()
+    (tmp_path / "chapter_summaries" / f"{'b' * 40}.md").write_text("Lazy stacks summary.", encoding="utf-8")
+    index = SimilarityIndex(str(tmp_path / "similarity.npz"))
+
+    assert index.index_directory(str(tmp_path)) == 1
+    assert {(row["year"], row["video_id"]) for row in index.rows} == {("2025", "101")}
@@ -0,0 +1,65 @@
+import asyncio
+import os
+
+import pytest
+
+from src.agent import wwdc_translator
+from src.agent.wwdc_translator import CacheType, get_cache, run_stage, save_cache
+
+pytestmark = pytest.mark.anyio
+
+
+def make_config(use_cache: bool = True) -> dict:
+    return {"configurable": {"year": "2025", "video_id": "101", "use_cache": use_cache}}
+
+
+@pytest.mark.parametrize("use_cache", [True, False])
+async def test_concurrent_runs_share_one_stage_run(tmp_path, monkeypatch, use_cache) -> None:
+    monkeypatch.setattr(wwdc_translator, "OUTPUT_BASE_DIR", str(tmp_path))
+    calls = []
+
+    async def produce() -> str:
+        calls.append(1)
+        await asyncio.sleep(0.8)
+        return "translated"
+
+    results = await asyncio.gather(*[
+        run_stage(make_config(use_cache), CacheType.PODCAST_SCRIPT, produce) for _ in range(3)])
+
+    assert results == ["translated"] * 3
+    assert len(calls) == 1
+
+
+async def test_stale_cache_is_regenerated_without_use_cache(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(wwdc_translator, "OUTPUT_BASE_DIR", str(tmp_path))
+    await save_cache("2025", "101", CacheType.PODCAST_SCRIPT, "old")
+
+    async def produce() -> str:
+        return "new"
+
+    assert await run_stage(make_config(use_cache=True), CacheType.PODCAST_SCRIPT, produce) == "old"
+    assert await run_stage(make_config(use_cache=False), CacheType.PODCAST_SCRIPT, produce) == "new"
+
+
+async def test_save_cache_replaces_atomically(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(wwdc_translator, "OUTPUT_BASE_DIR", str(tmp_path))
+    await save_cache("2025", "101", CacheType.PODCAST_SCRIPT, "first")
+    await save_cache("2025", "101", CacheType.PODCAST_SCRIPT, "second")
+
+    assert await get_cache("2025", "101", CacheType.PODCAST_SCRIPT) == "second"
+    assert await get_cache("2025", "102", CacheType.PODCAST_SCRIPT) is None
+    assert os.listdir(tmp_path / "2025") == ["101_podcast.json"]
+
+
+async def test_stage_budget_fails_fast(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(wwdc_translator, "OUTPUT_BASE_DIR", str(tmp_path))
+
+    async def produce() -> str:
+        await asyncio.sleep(5)
+        return "never"
+
+    config = make_config()
+    config["configurable"]["stage_timeout"] = 0.05
+    with pytest.raises(asyncio.TimeoutError, match="stage budget"):
+        await run_stage(config, CacheType.PODCAST_SCRIPT, produce)
+    assert await get_cache("2025", "101", CacheType.PODCAST_SCRIPT) is None
@@ -0,0 +1,34 @@
+from src.agent.translation_memory import (
+    SegmentedMarkdown,
+    TranslationMemory,
+    format_segments_request,
+    parse_segments_response,
+    segment_key,
+)
+
+
+def test_segments_skip_code_and_keep_prefixes() -> None:
+    markdown = "# Title\n\nHello there. Welcome to WWDC.\n\n```swift\nlet a = 1\n```"
+    document = SegmentedMarkdown.parse(markdown)
+    assert document.segments() == ["Title", "Hello there.", "Welcome to WWDC."]
+
+    translations = {
+        segment_key("Title"): "标题",
+        segment_key("Hello there."): "你好。",
+        segment_key("Welcome to WWDC."): "欢迎来到 WWDC。",
+    }
+    assert document.render(translations) == "# 标题\n\n你好。欢迎来到 WWDC。\n\n```swift\nlet a = 1\n```"
+
+
+def test_segments_response_round_trip() -> None:
+    request = format_segments_request(["One.", "Two."])
+    assert parse_segments_response(request, 2) == {0: "One.", 1: "Two."}
+
+
+def test_memory_serves_normalized_matches(tmp_path) -> None:
+    memory = TranslationMemory(str(tmp_path / "tm.sqlite3"))
+    memory.store([("It’s  great.", "太棒了。")])
+    assert memory.lookup(["It's great."]) == {segment_key("It's great."): "太棒了。"}
+
+    memory.update_glossary({"SwiftUI": "SwiftUI"})
+    assert memory.glossary() == {"SwiftUI": "SwiftUI"}
@@ -0,0 +1,76 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from src.bot.wwdc_watch import ListingWatcher, serve_status
+
+pytestmark = pytest.mark.anyio
+
+
+def listing(*video_ids: str) -> str:
+    cards = "".join(f'<a href="/cn/videos/play/wwdc2025/{video_id}/" data-category="SwiftUI">'
+                    f'<span class="vc-card__title">Session {video_id}</span></a>' for video_id in video_ids)
+    return f'<div class="main-content"><div class="vc-collection">{cards}</div></div>'
+
+
+def fake_site(pages: list[str], requests: list[httpx.Request]) -> httpx.AsyncClient:
+    def handle(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        etag = f'"{len(pages)}"'
+        if request.headers.get("If-None-Match") == etag:
+            return httpx.Response(304)
+        return httpx.Response(200, text=pages[-1], headers={"ETag": etag})
+    return httpx.AsyncClient(transport=httpx.MockTransport(handle))
+
+
+async def test_only_new_sessions_are_queued(tmp_path) -> None:
+    pages = [listing("101", "102")]
+    requests = []
+    translated = []
+
+    async def translate(video, pipeline=False, on_update=None):
+        translated.append(video["url"])
+        on_update("updates", {"crawl_wwdc_markdown": {}})
+        return not video["url"].endswith("/102/")
+
+    async with fake_site(pages, requests) as client:
+        watcher = ListingWatcher("2025", client, output_dir=str(tmp_path), translate=translate)
+        assert await watcher.poll() == 2
+        assert watcher.videos[0]["url"] == "https://developer.apple.com/cn/videos/play/wwdc2025/101/"
+        worker = asyncio.create_task(watcher.work())
+        await watcher.queue.join()
+
+        # unchanged listing: a conditional request, only the failed session is retried
+        assert await watcher.poll() == 1
+        assert requests[-1].headers["If-None-Match"] == '"1"'
+        await watcher.queue.join()
+
+        pages.append(listing("101", "102", "103"))
+        assert await watcher.poll() == 2
+        await watcher.queue.join()
+        worker.cancel()
+
+        status = watcher.status(interval=300)
+        assert status["ok"] and status["queue_depth"] == 0 and status["sessions"] == 3
+        assert status["translated"] == 2 and list(status["failed"].values()) == [3]
+        assert status["stage_lag"]["crawl_wwdc_markdown"]["count"] == 5
+
+        # a restarted watcher remembers the listing and what was translated
+        restarted = ListingWatcher("2025", client, output_dir=str(tmp_path), translate=translate)
+        assert restarted.known == watcher.known and restarted.etag == '"2"'
+        assert json.loads((tmp_path / "2025" / "videos.jsonl").read_text())["videos"][2]["title"] == "Session 103"
+
+        server = await serve_status(watcher, 300, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"GET /health HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        response = (await reader.read()).decode()
+        writer.close()
+        server.close()
+        await server.wait_closed()
+
+    head, body = response.split("\r\n\r\n", 1)
+    assert head.startswith("HTTP/1.1 200")
+    assert json.loads(body)["translated"] == 2